@@ -3,7 +3,7 @@
 @if "%~1"=="" goto skip
 
 @pushd %~dp0
-FF7R-DDS-tools.exe "%~1"
+FF7R-DDS-tools.exe %*
 @popd
 
 pause
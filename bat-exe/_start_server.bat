@@ -0,0 +1,7 @@
+@echo off
+
+@pushd %~dp0
+FF7R-DDS-tools.exe --mode=serve --jobs=0
+@popd
+
+pause
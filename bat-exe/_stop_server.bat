@@ -0,0 +1,7 @@
+@echo off
+
+@pushd %~dp0
+FF7R-DDS-tools.exe --client --stop
+@popd
+
+pause
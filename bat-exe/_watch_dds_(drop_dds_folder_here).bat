@@ -0,0 +1,11 @@
+@echo off
+
+@if "%~1"=="" goto skip
+
+@pushd %~dp0
+FF7R-DDS-tools.exe %* --save_folder=injected --mode=watch
+@popd
+
+pause
+
+:skip
\ No newline at end of file
@@ -3,7 +3,7 @@
 @if "%~1"=="" goto skip
 
 @pushd %~dp0
-python src\main.py "%~1" --mode=copy_uasset
+python src\main.py %* --mode=copy_uasset
 @popd
 
 pause
@@ -3,7 +3,7 @@
 @if "%~1"=="" goto skip
 
 @pushd %~dp0
-python src\main.py "%~1" --save_folder=injected --mode=inject
+python src\main.py %* --save_folder=injected --mode=inject
 @popd
 
 pause
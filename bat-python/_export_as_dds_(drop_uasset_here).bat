@@ -3,7 +3,7 @@
 @if "%~1"=="" goto skip
 
 @pushd %~dp0
-python src\main.py "%~1" --save_folder=exported --mode=export
+python src\main.py %* --save_folder=exported --mode=export
 @popd
 
 pause
@@ -3,7 +3,7 @@
 @if "%~1"=="" goto skip
 
 @pushd %~dp0
-python src\main.py "%~1" --save_folder=removed --mode=remove_mipmaps
+python src\main.py %* --save_folder=removed --mode=remove_mipmaps
 @popd
 
 pause
@@ -0,0 +1,7 @@
+@echo off
+
+@pushd %~dp0
+python src\main.py --mode=serve --jobs=0
+@popd
+
+pause
@@ -0,0 +1,7 @@
+@echo off
+
+@pushd %~dp0
+python src\main.py --client --stop
+@popd
+
+pause
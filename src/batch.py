@@ -0,0 +1,100 @@
+import os, io, contextlib
+from io_util import UnsupportedError
+from profiler import PROFILER
+
+#get total size of the files a job will read
+def get_job_size(folder, file):
+    file = os.path.join(folder, file)
+    base, ext = os.path.splitext(file)
+    if ext in ['.dds', '.DDS']:
+        files = [file]
+    else:
+        files = [base + e for e in ['.uasset', '.uexp', '.ubulk']]
+    return sum([os.path.getsize(f) for f in files if os.path.exists(f)])
+
+#process pool kept alive between batch runs (serve mode)
+shared_executor = None
+shared_workers = 0
+
+def set_shared_executor(executor, workers=0):
+    global shared_executor, shared_workers
+    shared_executor = executor
+    shared_workers = workers
+
+def get_shared_executor():
+    return shared_executor
+
+#run a mode function in a worker and return its log (and profile results)
+#(cwd: working directory of the caller. workers of the shared pool can be used from different folders.)
+def run_job(func, folder, file, save_folder, profile=False, cwd=None):
+    if cwd is not None and cwd!=os.getcwd():
+        os.chdir(cwd)
+    log = io.StringIO()
+    error = None
+    PROFILER.enabled = profile
+    with contextlib.redirect_stdout(log), PROFILER.file(file):
+        try:
+            func(folder, file, save_folder, clear=False)
+        except Exception as e:
+            error = get_error_info(e)
+    return log.getvalue(), error, PROFILER.pop_results()
+
+#run a mode function for each file with a process pool
+def run_parallel(func, folder, file_list, save_folder, jobs, profile=False):
+    if jobs<=0:
+        jobs = shared_workers if shared_executor is not None else os.cpu_count()
+
+    #schedule the largest assets first
+    sizes = [get_job_size(folder, file) for file in file_list]
+    order = sorted(range(len(file_list)), key=lambda i: -sizes[i])
+
+    #(the shared pool can be larger than jobs. it runs jobs of other clients too.)
+    if shared_executor is not None:
+        return submit_jobs(shared_executor, func, folder, file_list, order, save_folder, profile, jobs)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return submit_jobs(executor, func, folder, file_list, order, save_folder, profile, jobs)
+
+#submit jobs in the order and print results in the order of the file list
+#(at most max_jobs files are processed at the same time)
+def submit_jobs(executor, func, folder, file_list, order, save_folder, profile, max_jobs):
+    from concurrent.futures import wait, FIRST_COMPLETED
+    errors = {}
+    cwd = os.getcwd()
+    futures = [None]*len(file_list)
+    running = set()
+    order = list(order)
+    for i, file in enumerate(file_list):
+        while futures[i] is None or not futures[i].done():
+            while len(running)<max_jobs and len(order)>0:
+                j = order.pop(0)
+                futures[j] = executor.submit(run_job, func, folder, file_list[j], save_folder, profile, cwd)
+                running.add(futures[j])
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+        log, error, results = futures[i].result()
+        futures[i] = None
+        PROFILER.results += results
+        print(log, end='')
+        if error is not None:
+            print('Error: {} ({})'.format(error[0], file))
+            errors[file] = error
+    return errors
+
+#get an error message and whether the asset is unsupported (version, format, exports)
+def get_error_info(e):
+    return str(e), isinstance(e, UnsupportedError)
+
+#print passed, failed and unsupported files and return the number of failed files
+#(errors: file -> (message, unsupported). see get_error_info)
+def print_summary(file_num, errors):
+    failed = [f for f in errors if not errors[f][1]]
+    unsupported = [f for f in errors if errors[f][1]]
+    print('Summary')
+    print('  passed: {}'.format(file_num-len(errors)))
+    print('  failed: {}'.format(len(failed)))
+    for file in failed:
+        print('    {}: {}'.format(file, errors[file][0]))
+    print('  unsupported: {}'.format(len(unsupported)))
+    for file in unsupported:
+        print('    {}: {}'.format(file, errors[file][0]))
+    return len(failed)
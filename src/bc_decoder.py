@@ -0,0 +1,189 @@
+import numpy as np
+from io_util import FileRange
+from bptc_decoder import decode_bc7, decode_bc6h, decode_bc6h_signed
+
+'''
+Block compression decoder
+
+decodes whole mipmaps with numpy. (no python loop for each block)
+outputs are RGBA8 arrays which shapes are (height, width, 4).
+(decode_hdr_mipmap outputs float16 arrays for HDR formats.)
+'''
+
+#number of blocks decoded at once (to limit memory usage of temporary arrays)
+BATCH_SIZE = 0x40000
+
+#rgb565 to rgb888
+def decode_565(c):
+    r = (c>>11)&31
+    g = (c>>5)&63
+    b = c&31
+    return np.stack([(r<<3)|(r>>2), (g<<2)|(g>>4), (b<<3)|(b>>2)], axis=-1)
+
+#pick palette entries for each texel (palette: (N, n), indices: (N, 16))
+def lookup(palette, indices):
+    n = palette.shape[1]
+    base = np.arange(0, len(palette)*n, n, dtype=np.int32)[:, None]
+    return palette.reshape(-1)[indices + base]
+
+#integer lerp with rounding
+def lerp(a, b, w, d):
+    return ((d-w)*a + w*b + d//2)//d
+
+#table to unpack n-bit indices from packed bits (packed bits -> 4 indices as uint32)
+def make_index_table(bit_num):
+    bits = np.arange(1<<(bit_num*4), dtype=np.uint32)[:, None]
+    shifts = np.arange(0, bit_num*4, bit_num, dtype=np.uint32)
+    indices = ((bits >> shifts) & ((1<<bit_num)-1)).astype(np.uint8)
+    return indices.view(np.uint32)[:, 0]
+
+#palettes of BC4 blocks for all endpoint pairs ((a0<<8)|a1 -> 8 values)
+def make_bc4_palette_table():
+    a = np.arange(256, dtype=np.int32)
+    a0 = np.repeat(a, 256)[:, None]
+    a1 = np.tile(a, 256)[:, None]
+    w = np.arange(1, 7, dtype=np.int32)[None, :]
+    eight = np.concatenate([a0, a1, lerp(a0, a1, w, 7)], axis=1)
+    six = np.concatenate([a0, a1, lerp(a0, a1, w[:, :4], 5), np.zeros_like(a0), np.full_like(a0, 255)], axis=1)
+    return np.where(a0>a1, eight, six).astype(np.uint8)
+
+#RGBA8 colors for all rgb565 values (as uint32)
+def make_rgb565_table():
+    rgba = np.full((1<<16, 4), 255, dtype=np.uint8)
+    rgba[:, :3] = decode_565(np.arange(1<<16, dtype=np.int32))
+    return rgba.view(np.uint32)[:, 0]
+
+RGB565_TABLE = make_rgb565_table()
+INDEX_TABLE_2BIT = make_index_table(2)
+INDEX_TABLE_3BIT = make_index_table(3)
+BC4_PALETTE_TABLE = make_bc4_palette_table()
+
+#BC1 color block (8 bytes) to RGBA (N, 16, 4)
+def decode_bc1_blocks(blocks, has_alpha=True):
+    c = blocks[:, :4].copy().view('<u2')
+    c0 = c[:, 0]
+    c1 = c[:, 1]
+    p0 = RGB565_TABLE[c0].view(np.uint8).reshape(-1, 4).astype(np.int16)
+    p1 = RGB565_TABLE[c1].view(np.uint8).reshape(-1, 4).astype(np.int16)
+
+    #3 colors + transparent black when c0<=c1 (BC1 only)
+    if has_alpha:
+        four = (c0>c1)[:, None]
+        p2 = np.where(four, lerp(p0, p1, 1, 3), lerp(p0, p1, 1, 2))
+        p3 = np.where(four, lerp(p0, p1, 2, 3), 0)
+    else:
+        p2 = lerp(p0, p1, 1, 3)
+        p3 = lerp(p0, p1, 2, 3)
+
+    palette = np.empty((len(blocks), 4, 4), dtype=np.uint8)
+    palette[:, 0] = p0
+    palette[:, 1] = p1
+    palette[:, 2] = p2
+    palette[:, 3] = p3
+
+    #4 indices (2 bits) per byte
+    indices = INDEX_TABLE_2BIT[blocks[:, 4:]].view(np.uint8)
+    return lookup(palette.view(np.uint32)[:, :, 0], indices).view(np.uint8).reshape(-1, 16, 4)
+
+#BC4 block (8 bytes) to single channel (N, 16)
+def decode_bc4_blocks(blocks):
+    palette = BC4_PALETTE_TABLE[blocks[:, :2].copy().view('>u2')[:, 0]]
+
+    #8 indices (3 bits) per 3 bytes
+    b = blocks[:, 2:].reshape(-1, 2, 3).astype(np.uint32)
+    bits = b[:, :, 0] | (b[:, :, 1]<<8) | (b[:, :, 2]<<16)
+    bits = np.stack([bits & 0xFFF, bits >> 12], axis=-1).reshape(-1, 4)
+    indices = INDEX_TABLE_3BIT[bits].view(np.uint8)
+    return lookup(palette, indices)
+
+def decode_bc1(blocks):
+    return decode_bc1_blocks(blocks)
+
+def decode_bc3(blocks):
+    rgba = decode_bc1_blocks(blocks[:, 8:], has_alpha=False)
+    rgba[:, :, 3] = decode_bc4_blocks(blocks[:, :8])
+    return rgba
+
+def decode_bc4(blocks):
+    r = decode_bc4_blocks(blocks).astype(np.uint32)
+    return (r*0x010101 | 0xFF000000).astype('<u4').view(np.uint8).reshape(-1, 16, 4)
+
+def decode_bc5(blocks):
+    rgba = np.zeros((len(blocks), 16, 4), dtype=np.uint8)
+    rgba[:, :, 0] = decode_bc4_blocks(blocks[:, :8])
+    rgba[:, :, 1] = decode_bc4_blocks(blocks[:, 8:])
+    rgba[:, :, 3] = 255
+    return rgba
+
+#format name: (block size, decoder)
+BLOCK_DECODERS = {
+    'DXT1/BC1': (8, decode_bc1),
+    'DXT5/BC3': (16, decode_bc3),
+    'BC4/ATI1': (8, decode_bc4),
+    'BC5/ATI2': (16, decode_bc5),
+    'BC7': (16, decode_bc7),
+}
+
+#format name: (block size, decoder) for HDR formats (outputs are float16 RGB)
+HDR_BLOCK_DECODERS = {
+    'BC6H(unsigned)': (16, decode_bc6h),
+    'BC6H(signed)': (16, decode_bc6h_signed),
+}
+
+#get numpy array from bytes, memoryview or FileRange
+def to_array(data):
+    if isinstance(data, FileRange):
+        data = data.read()
+    return np.frombuffer(data, dtype=np.uint8)
+
+#arrange decoded blocks (N, 16, C) as an image
+def blocks_to_image(pixels, width, height):
+    block_width = (width+3)//4
+    block_height = (height+3)//4
+    channel = pixels.shape[-1]
+    image = pixels.reshape(block_height, block_width, 4, 4, channel).transpose(0, 2, 1, 3, 4)
+    image = image.reshape(block_height*4, block_width*4, channel)
+    return image[:height, :width]
+
+#decode block compressed mipmap
+def decode_blocks(data, width, height, block_size, decoder):
+    block_num = ((width+3)//4) * ((height+3)//4)
+    data = to_array(data)
+    if len(data)<block_num*block_size:
+        raise RuntimeError('Mipmap data is too small. ({}x{}, {} bytes)'.format(width, height, len(data)))
+    blocks = data[:block_num*block_size].reshape(block_num, block_size)
+    pixels = [decoder(blocks[i:i+BATCH_SIZE]) for i in range(0, block_num, BATCH_SIZE)]
+    return blocks_to_image(np.concatenate(pixels), width, height)
+
+def decode_b8g8r8a8(data, width, height):
+    bgra = to_array(data)[:width*height*4].reshape(height, width, 4)
+    return bgra[:, :, [2, 1, 0, 3]]
+
+def decode_float_rgba(data, width, height):
+    return to_array(data)[:width*height*8].view('<f2').reshape(height, width, 4)
+
+#float RGB(A) to RGBA8 (values are clamped to [0, 1])
+def float_to_rgba8(image):
+    rgba = np.ones(image.shape[:2]+(4,), dtype=np.float32)
+    rgba[:, :, :image.shape[2]] = np.nan_to_num(image.astype(np.float32), nan=0, posinf=1, neginf=0)
+    return (np.clip(rgba, 0, 1)*255+0.5).astype(np.uint8)
+
+#decode HDR mipmap data to float16 array (RGB for BC6H, RGBA for FloatRGBA)
+def decode_hdr_mipmap(data, width, height, format_name):
+    if format_name in HDR_BLOCK_DECODERS:
+        block_size, decoder = HDR_BLOCK_DECODERS[format_name]
+        return decode_blocks(data, width, height, block_size, decoder)
+    elif format_name=='FloatRGBA':
+        return decode_float_rgba(data, width, height)
+    raise RuntimeError('Not an HDR format. ({})'.format(format_name))
+
+#decode mipmap data to RGBA8 array
+def decode_mipmap(data, width, height, format_name):
+    if format_name in BLOCK_DECODERS:
+        block_size, decoder = BLOCK_DECODERS[format_name]
+        return decode_blocks(data, width, height, block_size, decoder)
+    elif format_name=='B8G8R8A8(sRGB)':
+        return decode_b8g8r8a8(data, width, height)
+    elif format_name in HDR_BLOCK_DECODERS or format_name=='FloatRGBA':
+        return float_to_rgba8(decode_hdr_mipmap(data, width, height, format_name))
+    raise RuntimeError('Decoding is not supported for this format. ({})'.format(format_name))
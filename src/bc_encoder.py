@@ -0,0 +1,204 @@
+import numpy as np
+from bc_decoder import decode_565, BATCH_SIZE
+from bptc_decoder import WEIGHTS, unquantize
+
+'''
+Block compression encoder
+
+simple vectorized encoders to re-encode generated mipmaps.
+endpoints are fitted along the principal axis of each block.
+(BC7 uses mode 6 and BC6H uses mode 11 only.)
+'''
+
+#pad an image (h, w, C) to (height, width, C) by edge pixels
+def pad_image(image, width, height):
+    pad = ((0, height-image.shape[0]), (0, width-image.shape[1]), (0, 0))
+    return np.pad(image, pad, mode='edge')
+
+#pad an image and split it to blocks (N, 16, C)
+def image_to_blocks(image, width, height):
+    image = pad_image(image, width, height)
+    channel = image.shape[2]
+    blocks = image.reshape(height//4, 4, width//4, 4, channel).transpose(0, 2, 1, 3, 4)
+    return blocks.reshape(-1, 16, channel)
+
+#pack fields to bytes. fields: [(values (N,) or (N, k), bit num), ...]
+def pack_bits(fields):
+    bits = []
+    for values, bit_num in fields:
+        values = np.asarray(values, dtype=np.int64)
+        if values.ndim==1:
+            values = values[:, None]
+        shifts = np.arange(bit_num, dtype=np.int64)
+        bits.append(((values[:, :, None] >> shifts) & 1).astype(np.uint8).reshape(len(values), -1))
+    return np.packbits(np.concatenate(bits, axis=1), axis=1, bitorder='little')
+
+#endpoints on the principal axis of each block (pixels: (N, 16, C) float)
+def fit_line(pixels, iteration=4):
+    mean = pixels.mean(axis=1)
+    centered = pixels - mean[:, None]
+    cov = np.einsum('nki,nkj->nij', centered, centered)
+    axis = pixels.max(axis=1) - pixels.min(axis=1) + 1e-3
+    for i in range(iteration):
+        axis = np.einsum('nij,nj->ni', cov, axis) + 1e-6*axis
+        axis /= np.linalg.norm(axis, axis=1, keepdims=True) + 1e-12
+    proj = np.einsum('nki,ni->nk', centered, axis)
+    lo = mean + axis*proj.min(axis=1)[:, None]
+    hi = mean + axis*proj.max(axis=1)[:, None]
+    return lo, hi
+
+#find the nearest interpolation level for each pixel (levels: sorted weights in [0, 1])
+def fit_levels(pixels, e0, e1, levels):
+    d = e1-e0
+    dd = (d*d).sum(axis=1)
+    t = np.einsum('nki,ni->nk', pixels-e0[:, None], d) / np.maximum(dd, 1e-12)[:, None]
+    middle = (levels[1:]+levels[:-1])/2
+    return np.searchsorted(middle, t)
+
+#BC1 color block. 3 color mode is used for blocks with transparent pixels when has_alpha is True
+def encode_bc1_blocks(pixels, has_alpha=True):
+    rgb = pixels[:, :, :3].astype(np.float32)
+    lo, hi = fit_line(rgb)
+    lo = np.clip(lo, 0, 255)
+    hi = np.clip(hi, 0, 255)
+    c0 = to_565(hi)
+    c1 = to_565(lo)
+
+    if has_alpha:
+        transparent = pixels[:, :, 3]<128
+        three = transparent.any(axis=1)
+    else:
+        transparent = np.zeros(pixels.shape[:2], dtype=bool)
+        three = np.zeros(len(pixels), dtype=bool)
+
+    #c0>c1 for 4 color mode, c0<=c1 for 3 color mode
+    swap = np.where(three, c0>c1, c0<c1)
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+    e0 = decode_565(c0).astype(np.float32)
+    e1 = decode_565(c1).astype(np.float32)
+
+    four_levels = fit_levels(rgb, e0, e1, np.array([0, 1/3, 2/3, 1]))
+    three_levels = fit_levels(rgb, e0, e1, np.array([0, 1/2, 1]))
+    indices = np.where(three[:, None], np.array([0, 2, 1])[three_levels], np.array([0, 2, 3, 1])[four_levels])
+    indices[transparent] = 3
+
+    #palette is a single color when c0==c1
+    indices[(c0==c1) & ~three] = 0
+    return pack_bits([(c0, 16), (c1, 16), (indices, 2)])
+
+def to_565(rgb):
+    r = np.rint(rgb[:, 0]*31/255).astype(np.int64)
+    g = np.rint(rgb[:, 1]*63/255).astype(np.int64)
+    b = np.rint(rgb[:, 2]*31/255).astype(np.int64)
+    return (r<<11) | (g<<5) | b
+
+#BC4 block (single channel (N, 16))
+def encode_bc4_blocks(values):
+    values = values.astype(np.int64)
+    a0 = values.max(axis=1)
+    a1 = values.min(axis=1)
+    span = np.maximum(a0-a1, 1)[:, None]
+    level = ((a0[:, None]-values)*7 + span//2) // span
+    indices = np.array([0, 2, 3, 4, 5, 6, 7, 1])[level]
+    indices[a0==a1] = 0
+    return pack_bits([(a0, 8), (a1, 8), (indices, 3)])
+
+def encode_bc1(pixels):
+    return encode_bc1_blocks(pixels)
+
+def encode_bc3(pixels):
+    return np.concatenate([encode_bc4_blocks(pixels[:, :, 3]), encode_bc1_blocks(pixels, has_alpha=False)], axis=1)
+
+def encode_bc4(pixels):
+    return encode_bc4_blocks(pixels[:, :, 0])
+
+def encode_bc5(pixels):
+    return np.concatenate([encode_bc4_blocks(pixels[:, :, 0]), encode_bc4_blocks(pixels[:, :, 1])], axis=1)
+
+#quantize RGBA8 endpoints to 7 bits + p-bit
+#(alpha errors are weighted to keep opaque and transparent pixels exact)
+def quantize_with_pbit(endpoint):
+    best = None
+    channel_weights = np.array([1, 1, 1, 16])
+    for pbit in [0, 1]:
+        q = np.clip(np.rint((endpoint-pbit)/2), 0, 127)
+        err = ((q*2+pbit-endpoint)**2 * channel_weights).sum(axis=1)
+        if best is None:
+            best = [q, np.zeros(len(q), dtype=np.int64), err]
+        else:
+            better = err<best[2]
+            best[0] = np.where(better[:, None], q, best[0])
+            best[1] = np.where(better, 1, best[1])
+            best[2] = np.minimum(err, best[2])
+    return best[0].astype(np.int64), best[1]
+
+#BC7 mode 6 (RGBA 7 bits + p-bit, 4 bit indices)
+def encode_bc7(pixels):
+    rgba = pixels.astype(np.float32)
+    lo, hi = fit_line(rgba)
+    q0, p0 = quantize_with_pbit(np.clip(lo, 0, 255))
+    q1, p1 = quantize_with_pbit(np.clip(hi, 0, 255))
+    e0 = (q0*2+p0[:, None]).astype(np.float32)
+    e1 = (q1*2+p1[:, None]).astype(np.float32)
+    indices = fit_levels(rgba, e0, e1, WEIGHTS[4]/64)
+
+    #the 1st index has no MSB
+    flip = indices[:, 0]>=8
+    q0, q1 = np.where(flip[:, None], q1, q0), np.where(flip[:, None], q0, q1)
+    p0, p1 = np.where(flip, p1, p0), np.where(flip, p0, p1)
+    indices = np.where(flip[:, None], 15-indices, indices)
+
+    fields = [(np.full(len(pixels), 1<<6), 7)]
+    for c in range(4):
+        fields += [(q0[:, c], 7), (q1[:, c], 7)]
+    fields += [(p0, 1), (p1, 1), (indices[:, :1], 3), (indices[:, 1:], 4)]
+    return pack_bits(fields)
+
+#BC6H mode 11 (10 bits endpoints, 4 bit indices). pixels: (N, 16, 3) float
+def encode_bc6h(pixels):
+    half = np.clip(np.nan_to_num(pixels, nan=0), 0, 65504).astype(np.float16).view(np.uint16)
+    #interpolation is linear for 16 bit values before finish_unquantize
+    values = half.astype(np.float32)*64/31
+    lo, hi = fit_line(values)
+    q0 = np.clip(np.rint((lo-32)/64), 0, 1023).astype(np.int32)
+    q1 = np.clip(np.rint((hi-32)/64), 0, 1023).astype(np.int32)
+    e0 = unquantize(q0, 10, False).astype(np.float32)
+    e1 = unquantize(q1, 10, False).astype(np.float32)
+    indices = fit_levels(values, e0, e1, WEIGHTS[4]/64)
+
+    #the 1st index has no MSB
+    flip = indices[:, 0]>=8
+    q0, q1 = np.where(flip[:, None], q1, q0), np.where(flip[:, None], q0, q1)
+    indices = np.where(flip[:, None], 15-indices, indices)
+
+    fields = [(np.full(len(pixels), 0x03), 5)]
+    fields += [(q0[:, c], 10) for c in range(3)]
+    fields += [(q1[:, c], 10) for c in range(3)]
+    fields += [(indices[:, :1], 3), (indices[:, 1:], 4)]
+    return pack_bits(fields)
+
+#format name: encoder (inputs are RGBA8 blocks, or float RGB blocks for BC6H)
+BLOCK_ENCODERS = {
+    'DXT1/BC1': encode_bc1,
+    'DXT5/BC3': encode_bc3,
+    'BC4/ATI1': encode_bc4,
+    'BC5/ATI2': encode_bc5,
+    'BC7': encode_bc7,
+    'BC6H(unsigned)': encode_bc6h,
+}
+
+#encode an image (float array (h, w, C)) as mipmap data. width and height are the padded size.
+#(RGBA in [0, 255] for LDR formats, RGB(A) floats for HDR formats)
+def encode_mipmap(image, width, height, format_name):
+    if format_name=='B8G8R8A8(sRGB)':
+        image = np.clip(np.rint(pad_image(image, width, height)), 0, 255).astype(np.uint8)
+        return image[:, :, [2, 1, 0, 3]].tobytes()
+    elif format_name=='FloatRGBA':
+        return pad_image(image, width, height).astype('<f2').tobytes()
+    elif format_name in BLOCK_ENCODERS:
+        blocks = image_to_blocks(image, width, height)
+        if format_name!='BC6H(unsigned)':
+            blocks = np.clip(np.rint(blocks), 0, 255).astype(np.uint8)
+        encoder = BLOCK_ENCODERS[format_name]
+        return b''.join([encoder(blocks[i:i+BATCH_SIZE]).tobytes() for i in range(0, len(blocks), BATCH_SIZE)])
+    raise RuntimeError('Encoding is not supported for this format. ({})'.format(format_name))
@@ -0,0 +1,267 @@
+import os, sys, io, time, json, shutil, argparse, platform, tracemalloc, contextlib
+from io_util import *
+from uasset import UassetHeader, UassetImport, UassetExport
+from texture_asset import TextureUasset, MipmapMetadata, BYTE_PER_PIXEL, PF_FORMAT, get_all_file_path
+from dds import DDS, get_mipmap_sizes
+
+'''
+Benchmark for texture assets
+
+makes synthetic assets for each format, size and ubulk setting,
+then measures throughput (MB/s) and peak memory (tracemalloc) of each operation.
+
+usage: python benchmark.py --sizes 64,1024,4096 --save_file result.json
+       python benchmark.py --compare old.json new.json
+'''
+
+NAMES = ['/Script/Engine', 'Texture2D', None, None, 'None', 'Default__Texture2D', '/Script/CoreUObject', 'Class', 'Package']
+NAME_ID = 2
+TYPE_NAME_ID = 3
+NONE_NAME_ID = 4
+
+#mipmaps larger than this are stored in ubulk (same as TextureUasset.inject_dds)
+UBULK_PIXEL_NUM = 1024**2
+
+#make a synthetic texture asset (.uasset, .uexp and .ubulk) with random mipmap data
+def make_texture(folder, name, type_name, width, height, has_ubulk):
+    format_name = PF_FORMAT[type_name]
+    mipmap_num = max(width, height).bit_length()
+    mipmap_size = get_mipmap_sizes(width, height, mipmap_num)
+    data_size = [int(w*h*BYTE_PER_PIXEL[format_name]) for w, h in mipmap_size]
+
+    ubulk_map_num = 0
+    if has_ubulk:
+        for i, (w, h) in enumerate(mipmap_size):
+            if i+1<mipmap_num and w*h>=UBULK_PIXEL_NUM:
+                ubulk_map_num += 1
+        if ubulk_map_num==0:
+            raise RuntimeError('The texture is too small to have ubulk. ({}x{})'.format(width, height))
+    uexp_map_num = mipmap_num-ubulk_map_num
+    uexp_map_data_size = sum(data_size[ubulk_map_num:])
+
+    #name table
+    name_list = list(NAMES)
+    name_list[NAME_ID] = name
+    name_list[TYPE_NAME_ID] = type_name
+    names = BinaryWriter()
+    for n in name_list:
+        names.write_str(n)
+        names.write(bytes(4))
+    names = names.getvalue()
+    import_offset = UassetHeader.LAYOUT.size+len(names)
+    export_offset = import_offset+UassetImport.LAYOUT.size*2
+    uasset_size = export_offset+UassetExport.LAYOUT.size+12
+
+    mkdir(folder)
+    uasset_name, uexp_name, ubulk_name = get_all_file_path(os.path.join(folder, name+'.uexp'))
+
+    #offset to uexp mipmaps (from the head of uasset) and offset to the end of uexp
+    map_offset = (2 + TextureUasset.SIZE_LAYOUT.size + 6 + TextureUasset.TEXTURE_LAYOUT.size + 4+len(type_name)+1
+                  + 12*has_ubulk + 8 + TextureUasset.MAP_DATA_LAYOUT.size)
+    offset = uasset_size + map_offset
+    end_offset = offset + uexp_map_data_size + mipmap_num*32 + 16
+
+    #uexp
+    with open(uexp_name, 'wb') as f:
+        f = BinaryWriter(f)
+        f.write(b'\x00\x03')
+        f.pack(TextureUasset.SIZE_LAYOUT, width, height, bytes(range(16)))
+        f.write(b'\x07\x08'+bytes(4))
+        f.pack(TextureUasset.TEXTURE_LAYOUT, 1, 1, 1, 0, TYPE_NAME_ID, 0, end_offset,
+               width, height, 1, TextureUasset.UBULK_FLAG[has_ubulk])
+        f.write_str(type_name)
+        if has_ubulk:
+            f.write_null_array(2)
+            f.write_uint32(ubulk_map_num)
+        f.write_uint32(0)
+        f.write_uint32(mipmap_num)
+        f.pack(TextureUasset.MAP_DATA_LAYOUT, 1, 64, uexp_map_data_size, uexp_map_data_size, offset, 0)
+        check(f.tell(), map_offset)
+        for size in data_size[ubulk_map_num:]:
+            f.write(os.urandom(size))
+        f.write_uint32_array(mipmap_size[ubulk_map_num]+[1, uexp_map_num])
+        offset = 0
+        for i, (size, wh) in enumerate(zip(data_size, mipmap_size)):
+            if i<ubulk_map_num:
+                MipmapMetadata(size, offset, wh, False).write(f, uasset_size)
+                offset += size
+            else:
+                MipmapMetadata(0, 0, wh, True).write(f, uasset_size)
+        f.write_uint32(NONE_NAME_ID)
+        f.write_null()
+        f.write(TextureUasset.UNREAL_SIGNATURE)
+        uexp_size = f.tell()
+
+    #ubulk
+    if has_ubulk:
+        with open(ubulk_name, 'wb') as f:
+            for size in data_size[:ubulk_map_num]:
+                f.write(os.urandom(size))
+
+    #uasset
+    with open(uasset_name, 'wb') as f:
+        f = BinaryWriter(f)
+        f.pack(UassetHeader.LAYOUT,
+            UassetHeader.HEAD, -7, bytes(16), uasset_size, 5, b'None\x00', bytes(4),
+            len(NAMES), UassetHeader.LAYOUT.size, bytes(8),
+            1, export_offset, 2, import_offset,
+            bytes(4), bytes(16), bytes(16), bytes(8), len(NAMES), bytes(36), bytes(4), bytes(4),
+            uasset_size, uasset_size+uexp_size-4, bytes(12), bytes(4), uasset_size)
+        f.write(names)
+        UassetImport.write(f, UassetImport(bytes(8), 7, bytes(8), 6, bytes(4)))
+        UassetImport.write(f, UassetImport(bytes(8), 1, bytes(8), 0, bytes(4)))
+        UassetExport.write(f, UassetExport(bytes(16), NAME_ID, bytes(8), uexp_size-4, 0, uasset_size, bytes(64)))
+        f.write(bytes(12))
+
+    return uexp_name
+
+def get_asset_size(file):
+    return sum([os.path.getsize(f) for f in get_all_file_path(file) if os.path.exists(f)])
+
+#operations to measure. each function returns the number of bytes it read or wrote.
+def op_load(asset_file, work_folder):
+    TextureUasset(asset_file)
+    return get_asset_size(asset_file)
+
+def op_save(asset_file, work_folder):
+    texture = TextureUasset(asset_file)
+    new_file = os.path.join(work_folder, 'save', os.path.basename(asset_file))
+    texture.save(new_file)
+    return get_asset_size(new_file)
+
+def op_dds_save(asset_file, work_folder):
+    texture = TextureUasset(asset_file)
+    dds_file = os.path.join(work_folder, 'dds', os.path.basename(asset_file)[:-5]+'.dds')
+    DDS.asset_to_DDS(texture).save(dds_file)
+    return os.path.getsize(dds_file)
+
+def op_dds_load(asset_file, work_folder):
+    dds_file = os.path.join(work_folder, 'dds', os.path.basename(asset_file)[:-5]+'.dds')
+    DDS.load(dds_file)
+    return os.path.getsize(dds_file)
+
+#inject_dds and remove_mipmaps are measured with save (they only rearrange mipmaps in memory)
+def op_inject_dds(asset_file, work_folder):
+    texture = TextureUasset(asset_file, lazy=True)
+    dds_file = os.path.join(work_folder, 'dds', os.path.basename(asset_file)[:-5]+'.dds')
+    texture.inject_dds(DDS.load(dds_file, lazy=True))
+    new_file = os.path.join(work_folder, 'inject', os.path.basename(asset_file))
+    texture.save(new_file)
+    return os.path.getsize(dds_file) + get_asset_size(new_file)
+
+def op_remove_mipmaps(asset_file, work_folder):
+    texture = TextureUasset(asset_file)
+    texture.remove_mipmaps()
+    new_file = os.path.join(work_folder, 'remove_mipmaps', os.path.basename(asset_file))
+    texture.save(new_file)
+    return get_asset_size(asset_file) + get_asset_size(new_file)
+
+#dds_save should run before dds_load and inject_dds
+OPERATIONS = {
+    'load': op_load,
+    'save': op_save,
+    'dds_save': op_dds_save,
+    'dds_load': op_dds_load,
+    'inject_dds': op_inject_dds,
+    'remove_mipmaps': op_remove_mipmaps,
+}
+
+#run an operation and return (bytes, best time, peak memory)
+def measure(func, asset_file, work_folder, repeat):
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            start = time.perf_counter()
+            size = func(asset_file, work_folder)
+            times.append(time.perf_counter()-start)
+
+        #tracemalloc slows python down. peak memory is measured in another run.
+        tracemalloc.start()
+        func(asset_file, work_folder)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return size, min(times), peak
+
+def run_benchmark(type_names, sizes, ubulk_modes, repeat, work_folder):
+    results = []
+    for type_name in type_names:
+        for size in sizes:
+            for has_ubulk in ubulk_modes:
+                if has_ubulk and size*size<UBULK_PIXEL_NUM:
+                    #small textures have no ubulk
+                    continue
+                if os.path.exists(work_folder):
+                    shutil.rmtree(work_folder)
+                name = 'T_{}_{}{}'.format(type_name[3:], size, '_ubulk'*has_ubulk)
+                asset_file = make_texture(os.path.join(work_folder, 'asset'), name, type_name, size, size, has_ubulk)
+                for op, func in OPERATIONS.items():
+                    nbytes, seconds, peak = measure(func, asset_file, work_folder, repeat)
+                    result = {
+                        'type': type_name,
+                        'size': size,
+                        'ubulk': has_ubulk,
+                        'operation': op,
+                        'bytes': nbytes,
+                        'seconds': seconds,
+                        'MB/s': nbytes/max(seconds, 1e-9)/1024**2,
+                        'peak_memory': peak,
+                    }
+                    results.append(result)
+                    print('{} {}x{}{} {}: {:.1f} MB/s, peak memory {:.1f} MB'.format(
+                        type_name, size, size, ' (ubulk)'*has_ubulk, op, result['MB/s'], peak/1024**2))
+    if os.path.exists(work_folder):
+        shutil.rmtree(work_folder)
+    return results
+
+def get_key(result):
+    return (result['type'], result['size'], result['ubulk'], result['operation'])
+
+#print speed ratios of two benchmark results
+def compare_results(old_file, new_file):
+    with open(old_file, 'r') as f:
+        old = {get_key(r): r for r in json.load(f)['results']}
+    with open(new_file, 'r') as f:
+        new = json.load(f)['results']
+    for result in new:
+        key = get_key(result)
+        if key not in old:
+            continue
+        ratio = result['MB/s']/max(old[key]['MB/s'], 1e-9)
+        memory = (result['peak_memory']+1)/(old[key]['peak_memory']+1)
+        print('{} {}x{}{} {}: speed x{:.2f}, memory x{:.2f}'.format(
+            key[0], key[1], key[1], ' (ubulk)'*key[2], key[3], ratio, memory))
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--formats', default=','.join(PF_FORMAT), type=str, help='pixel formats (e.g. PF_DXT1,PF_BC7)')
+    parser.add_argument('--sizes', default='64,256,1024,2048,4096,8192', type=str, help='texture sizes')
+    parser.add_argument('--ubulk', default='both', choices=['both', 'yes', 'no'], help='make assets with or without ubulk')
+    parser.add_argument('--repeat', default=3, type=int, help='number of runs for each operation')
+    parser.add_argument('--work_folder', default='workspace/benchmark', type=str, help='folder for generated files')
+    parser.add_argument('--save_file', default='benchmark.json', type=str, help='json file for results')
+    parser.add_argument('--compare', default=None, nargs=2, help='compare two result files')
+    return parser.parse_args()
+
+if __name__=='__main__':
+    args = get_args()
+    if args.compare:
+        compare_results(*args.compare)
+        sys.exit()
+
+    type_names = args.formats.split(',')
+    for type_name in type_names:
+        if type_name not in PF_FORMAT:
+            raise RuntimeError('Unsupported format. ({})'.format(type_name))
+    sizes = [int(s) for s in args.sizes.split(',')]
+    ubulk_modes = {'both': [False, True], 'yes': [True], 'no': [False]}[args.ubulk]
+
+    results = run_benchmark(type_names, sizes, ubulk_modes, args.repeat, args.work_folder)
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    with open(args.save_file, 'w') as f:
+        json.dump(info, f, indent=2)
+    print('save: ' + args.save_file)
@@ -0,0 +1,332 @@
+import numpy as np
+
+'''
+BC6H and BC7 decoder
+
+blocks are grouped by their modes, and each group is decoded with numpy at once.
+BC7 outputs RGBA8 (N, 16, 4). BC6H outputs float16 RGB (N, 16, 3).
+'''
+
+#partitions for 2 subsets (BC6H uses the first 32 of them)
+PARTITION_2 = np.array([
+    [0,0,1,1,0,0,1,1,0,0,1,1,0,0,1,1], [0,0,0,1,0,0,0,1,0,0,0,1,0,0,0,1], [0,1,1,1,0,1,1,1,0,1,1,1,0,1,1,1], [0,0,0,1,0,0,1,1,0,0,1,1,0,1,1,1],
+    [0,0,0,0,0,0,0,1,0,0,0,1,0,0,1,1], [0,0,1,1,0,1,1,1,0,1,1,1,1,1,1,1], [0,0,0,1,0,0,1,1,0,1,1,1,1,1,1,1], [0,0,0,0,0,0,0,1,0,0,1,1,0,1,1,1],
+    [0,0,0,0,0,0,0,0,0,0,0,1,0,0,1,1], [0,0,1,1,0,1,1,1,1,1,1,1,1,1,1,1], [0,0,0,0,0,0,0,1,0,1,1,1,1,1,1,1], [0,0,0,0,0,0,0,0,0,0,0,1,0,1,1,1],
+    [0,0,0,1,0,1,1,1,1,1,1,1,1,1,1,1], [0,0,0,0,0,0,0,0,1,1,1,1,1,1,1,1], [0,0,0,0,1,1,1,1,1,1,1,1,1,1,1,1], [0,0,0,0,0,0,0,0,0,0,0,0,1,1,1,1],
+    [0,0,0,0,1,0,0,0,1,1,1,0,1,1,1,1], [0,1,1,1,0,0,0,1,0,0,0,0,0,0,0,0], [0,0,0,0,0,0,0,0,1,0,0,0,1,1,1,0], [0,1,1,1,0,0,1,1,0,0,0,1,0,0,0,0],
+    [0,0,1,1,0,0,0,1,0,0,0,0,0,0,0,0], [0,0,0,0,1,0,0,0,1,1,0,0,1,1,1,0], [0,0,0,0,0,0,0,0,1,0,0,0,1,1,0,0], [0,1,1,1,0,0,1,1,0,0,1,1,0,0,0,1],
+    [0,0,1,1,0,0,0,1,0,0,0,1,0,0,0,0], [0,0,0,0,1,0,0,0,1,0,0,0,1,1,0,0], [0,1,1,0,0,1,1,0,0,1,1,0,0,1,1,0], [0,0,1,1,0,1,1,0,0,1,1,0,1,1,0,0],
+    [0,0,0,1,0,1,1,1,1,1,1,0,1,0,0,0], [0,0,0,0,1,1,1,1,1,1,1,1,0,0,0,0], [0,1,1,1,0,0,0,1,1,0,0,0,1,1,1,0], [0,0,1,1,1,0,0,1,1,0,0,1,1,1,0,0],
+    [0,1,0,1,0,1,0,1,0,1,0,1,0,1,0,1], [0,0,0,0,1,1,1,1,0,0,0,0,1,1,1,1], [0,1,0,1,1,0,1,0,0,1,0,1,1,0,1,0], [0,0,1,1,0,0,1,1,1,1,0,0,1,1,0,0],
+    [0,0,1,1,1,1,0,0,0,0,1,1,1,1,0,0], [0,1,0,1,0,1,0,1,1,0,1,0,1,0,1,0], [0,1,1,0,1,0,0,1,0,1,1,0,1,0,0,1], [0,1,0,1,1,0,1,0,1,0,1,0,0,1,0,1],
+    [0,1,1,1,0,0,1,1,1,1,0,0,1,1,1,0], [0,0,0,1,0,0,1,1,1,1,0,0,1,0,0,0], [0,0,1,1,0,0,1,0,0,1,0,0,1,1,0,0], [0,0,1,1,1,0,1,1,1,1,0,1,1,1,0,0],
+    [0,1,1,0,1,0,0,1,1,0,0,1,0,1,1,0], [0,0,1,1,1,1,0,0,1,1,0,0,0,0,1,1], [0,1,1,0,0,1,1,0,1,0,0,1,1,0,0,1], [0,0,0,0,0,1,1,0,0,1,1,0,0,0,0,0],
+    [0,1,0,0,1,1,1,0,0,1,0,0,0,0,0,0], [0,0,1,0,0,1,1,1,0,0,1,0,0,0,0,0], [0,0,0,0,0,0,1,0,0,1,1,1,0,0,1,0], [0,0,0,0,0,1,0,0,1,1,1,0,0,1,0,0],
+    [0,1,1,0,1,1,0,0,1,0,0,1,0,0,1,1], [0,0,1,1,0,1,1,0,1,1,0,0,1,0,0,1], [0,1,1,0,0,0,1,1,1,0,0,1,1,1,0,0], [0,0,1,1,1,0,0,1,1,1,0,0,0,1,1,0],
+    [0,1,1,0,1,1,0,0,1,1,0,0,1,0,0,1], [0,1,1,0,0,0,1,1,0,0,1,1,1,0,0,1], [0,1,1,1,1,1,1,0,1,0,0,0,0,0,0,1], [0,0,0,1,1,0,0,0,1,1,1,0,0,1,1,1],
+    [0,0,0,0,1,1,1,1,0,0,1,1,0,0,1,1], [0,0,1,1,0,0,1,1,1,1,1,1,0,0,0,0], [0,0,1,0,0,0,1,0,1,1,1,0,1,1,1,0], [0,1,0,0,0,1,0,0,0,1,1,1,0,1,1,1],
+])
+
+#partitions for 3 subsets
+PARTITION_3 = np.array([
+    [0,0,1,1,0,0,1,1,0,2,2,1,2,2,2,2], [0,0,0,1,0,0,1,1,2,2,1,1,2,2,2,1], [0,0,0,0,2,0,0,1,2,2,1,1,2,2,1,1], [0,2,2,2,0,0,2,2,0,0,1,1,0,1,1,1],
+    [0,0,0,0,0,0,0,0,1,1,2,2,1,1,2,2], [0,0,1,1,0,0,1,1,0,0,2,2,0,0,2,2], [0,0,2,2,0,0,2,2,1,1,1,1,1,1,1,1], [0,0,1,1,0,0,1,1,2,2,1,1,2,2,1,1],
+    [0,0,0,0,0,0,0,0,1,1,1,1,2,2,2,2], [0,0,0,0,1,1,1,1,1,1,1,1,2,2,2,2], [0,0,0,0,1,1,1,1,2,2,2,2,2,2,2,2], [0,0,1,2,0,0,1,2,0,0,1,2,0,0,1,2],
+    [0,1,1,2,0,1,1,2,0,1,1,2,0,1,1,2], [0,1,2,2,0,1,2,2,0,1,2,2,0,1,2,2], [0,0,1,1,0,1,1,2,1,1,2,2,1,2,2,2], [0,0,1,1,2,0,0,1,2,2,0,0,2,2,2,0],
+    [0,0,0,1,0,0,1,1,0,1,1,2,1,1,2,2], [0,1,1,1,0,0,1,1,2,0,0,1,2,2,0,0], [0,0,0,0,1,1,2,2,1,1,2,2,1,1,2,2], [0,0,2,2,0,0,2,2,0,0,2,2,1,1,1,1],
+    [0,1,1,1,0,1,1,1,0,2,2,2,0,2,2,2], [0,0,0,1,0,0,0,1,2,2,2,1,2,2,2,1], [0,0,0,0,0,0,1,1,0,1,2,2,0,1,2,2], [0,0,0,0,1,1,0,0,2,2,1,0,2,2,1,0],
+    [0,1,2,2,0,1,2,2,0,0,1,1,0,0,0,0], [0,0,1,2,0,0,1,2,1,1,2,2,2,2,2,2], [0,1,1,0,1,2,2,1,1,2,2,1,0,1,1,0], [0,0,0,0,0,1,1,0,1,2,2,1,1,2,2,1],
+    [0,0,2,2,1,1,0,2,1,1,0,2,0,0,2,2], [0,1,1,0,0,1,1,0,2,0,0,2,2,2,2,2], [0,0,1,1,0,1,2,2,0,1,2,2,0,0,1,1], [0,0,0,0,2,0,0,0,2,2,1,1,2,2,2,1],
+    [0,0,0,0,0,0,0,2,1,1,2,2,1,2,2,2], [0,2,2,2,0,0,2,2,0,0,1,2,0,0,1,1], [0,0,1,1,0,0,1,2,0,0,2,2,0,2,2,2], [0,1,2,0,0,1,2,0,0,1,2,0,0,1,2,0],
+    [0,0,0,0,1,1,1,1,2,2,2,2,0,0,0,0], [0,1,2,0,1,2,0,1,2,0,1,2,0,1,2,0], [0,1,2,0,2,0,1,2,1,2,0,1,0,1,2,0], [0,0,1,1,2,2,0,0,1,1,2,2,0,0,1,1],
+    [0,0,1,1,1,1,2,2,2,2,0,0,0,0,1,1], [0,1,0,1,0,1,0,1,2,2,2,2,2,2,2,2], [0,0,0,0,0,0,0,0,2,1,2,1,2,1,2,1], [0,0,2,2,1,1,2,2,0,0,2,2,1,1,2,2],
+    [0,0,2,2,0,0,1,1,0,0,2,2,0,0,1,1], [0,2,2,0,1,2,2,1,0,2,2,0,1,2,2,1], [0,1,0,1,2,2,2,2,2,2,2,2,0,1,0,1], [0,0,0,0,2,1,2,1,2,1,2,1,2,1,2,1],
+    [0,1,0,1,0,1,0,1,0,1,0,1,2,2,2,2], [0,2,2,2,0,1,1,1,0,2,2,2,0,1,1,1], [0,0,0,2,1,1,1,2,0,0,0,2,1,1,1,2], [0,0,0,0,2,1,1,2,2,1,1,2,2,1,1,2],
+    [0,2,2,2,0,1,1,1,0,1,1,1,0,2,2,2], [0,0,0,2,1,1,1,2,1,1,1,2,0,0,0,2], [0,1,1,0,0,1,1,0,0,1,1,0,2,2,2,2], [0,0,0,0,0,0,0,0,2,1,1,2,2,1,1,2],
+    [0,1,1,0,0,1,1,0,2,2,2,2,2,2,2,2], [0,0,2,2,0,0,1,1,0,0,1,1,0,0,2,2], [0,0,2,2,1,1,2,2,1,1,2,2,0,0,2,2], [0,0,0,0,0,0,0,0,0,0,0,0,2,1,1,2],
+    [0,0,0,2,0,0,0,1,0,0,0,2,0,0,0,1], [0,2,2,2,1,2,2,2,0,2,2,2,1,2,2,2], [0,1,0,1,2,2,2,2,2,2,2,2,2,2,2,2], [0,1,1,1,2,0,1,1,2,2,0,1,2,2,2,0],
+])
+
+#anchor texels of the 2nd subset (2 subsets)
+ANCHOR_2 = np.array([
+    15,15,15,15,15,15,15,15, 15,15,15,15,15,15,15,15, 15, 2, 8, 2, 2, 8, 8,15,  2, 8, 2, 2, 8, 8, 2, 2,
+    15,15, 6, 8, 2, 8,15,15,  2, 8, 2, 2, 2,15,15, 6,  6, 2, 6, 8,15,15, 2, 2, 15,15,15,15,15, 2, 2,15,
+])
+
+#anchor texels of the 2nd and 3rd subsets (3 subsets)
+ANCHOR_3 = np.array([[
+     3, 3,15,15, 8, 3,15,15,  8, 8, 6, 6, 6, 5, 3, 3,  3, 3, 8,15, 3, 3, 6,10,  5, 8, 8, 6, 8, 5,15,15,
+     8,15, 3, 5, 6,10, 8,15, 15, 3,15, 5,15,15,15,15,  3,15, 5, 5, 5, 8, 5,10,  5,10, 8,13,15,12, 3, 3,
+], [
+    15, 8, 8, 3,15,15, 3, 8, 15,15,15,15,15,15,15, 8, 15, 8,15, 3,15, 8,15, 8,  3,15, 6,10,15,15,10, 8,
+    15, 3,15,10,10, 8, 9,10,  6,15, 8,15, 3, 6, 6, 8, 15, 3,15,15,15,15,15,15, 15,15,15,15, 3,15,15, 8,
+]]).T
+
+#interpolation weights for 2, 3 and 4 bit indices
+WEIGHTS = {
+    2: np.array([0, 21, 43, 64], dtype=np.int32),
+    3: np.array([0, 9, 18, 27, 37, 46, 55, 64], dtype=np.int32),
+    4: np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64], dtype=np.int32),
+}
+
+#unpack blocks (N, 16) to bits (N, 128+8). (the padding is for reading indices at the end)
+def unpack_bits(blocks):
+    bits = np.zeros((len(blocks), 136), dtype=np.uint8)
+    bits[:, :128] = np.unpackbits(blocks, axis=1, bitorder='little')
+    return bits
+
+#read a field at the same offset for all blocks
+def read_bits(bits, offset, width):
+    if width==0:
+        return np.zeros(len(bits), dtype=np.int32)
+    field = bits[:, offset:offset+width].astype(np.int32)
+    return (field << np.arange(width, dtype=np.int32)).sum(axis=1, dtype=np.int32)
+
+#read indices of 16 texels (anchor texels have 1 less bit)
+def read_indices(bits, offset, index_bits, anchors):
+    widths = index_bits - anchors.astype(np.int32)
+    offsets = offset + np.cumsum(widths, axis=1) - widths
+    indices = np.zeros(anchors.shape, dtype=np.int32)
+    for k in range(index_bits):
+        bit = np.take_along_axis(bits, offsets+k, axis=1).astype(np.int32)
+        indices |= (bit << k) * (k<widths)
+    return indices
+
+#get anchor flags (N, 16) and subset ids (N, 16) of each texel
+def get_subsets(partition, subset_num):
+    anchors = np.zeros((len(partition), 16), dtype=bool)
+    anchors[:, 0] = True
+    rows = np.arange(len(partition))
+    if subset_num==1:
+        return anchors, np.zeros((len(partition), 16), dtype=np.intp)
+    elif subset_num==2:
+        anchors[rows, ANCHOR_2[partition]] = True
+        return anchors, PARTITION_2[partition]
+    anchors[rows, ANCHOR_3[partition, 0]] = True
+    anchors[rows, ANCHOR_3[partition, 1]] = True
+    return anchors, PARTITION_3[partition]
+
+#interpolate endpoints (N, E, C) for each texel
+def interpolate(endpoints, subsets, weights):
+    block_num, endpoint_num, channel = endpoints.shape
+    ids = subsets*2 + np.arange(0, block_num*endpoint_num, endpoint_num)[:, None]
+    endpoints = endpoints.reshape(-1, channel)
+    w = weights[:, :, None].astype(endpoints.dtype)
+    e0 = np.take(endpoints, ids, axis=0)
+    e1 = np.take(endpoints, ids+1, axis=0)
+    return (e0*(64-w) + e1*w + 32) >> 6
+
+#BC7 modes: subsets, partition bits, rotation bits, index selection bits,
+#           color bits, alpha bits, endpoint p-bits, shared p-bits, index bits, secondary index bits
+BC7_MODES = [
+    (3, 4, 0, 0, 4, 0, 1, 0, 3, 0),
+    (2, 6, 0, 0, 6, 0, 0, 1, 3, 0),
+    (3, 6, 0, 0, 5, 0, 0, 0, 2, 0),
+    (2, 6, 0, 0, 7, 0, 1, 0, 2, 0),
+    (1, 0, 2, 1, 5, 6, 0, 0, 2, 3),
+    (1, 0, 2, 0, 7, 8, 0, 0, 2, 2),
+    (1, 0, 0, 0, 7, 7, 1, 0, 4, 0),
+    (2, 6, 0, 0, 5, 5, 1, 0, 2, 0),
+]
+
+#mode of BC7 block is the position of the lowest 1 bit (8: invalid)
+BC7_MODE_TABLE = np.array([8]+[(i & -i).bit_length()-1 for i in range(1, 256)], dtype=np.uint8)
+
+#expand n-bit values to 8 bits
+def expand_bits(x, bit_num):
+    x = x << (8-bit_num)
+    return x | (x >> bit_num)
+
+def decode_bc7_mode(blocks, mode):
+    subset_num, partition_bits, rotation_bits, index_sel_bits, color_bits, alpha_bits, \
+        endpoint_pbit, shared_pbit, index_bits, index_bits2 = BC7_MODES[mode]
+    bits = unpack_bits(blocks)
+    block_num = len(blocks)
+    offset = mode+1
+
+    partition = read_bits(bits, offset, partition_bits)
+    offset += partition_bits
+    rotation = read_bits(bits, offset, rotation_bits)
+    offset += rotation_bits
+    index_sel = read_bits(bits, offset, index_sel_bits)
+    offset += index_sel_bits
+
+    #endpoints (N, subset_num*2, RGBA)
+    endpoint_num = subset_num*2
+    endpoints = np.zeros((block_num, endpoint_num, 4), dtype=np.int32)
+    for c in range(3 + (alpha_bits>0)):
+        bit_num = [color_bits, alpha_bits][c==3]
+        for e in range(endpoint_num):
+            endpoints[:, e, c] = read_bits(bits, offset, bit_num)
+            offset += bit_num
+
+    #p-bits
+    if endpoint_pbit or shared_pbit:
+        for e in range(endpoint_num):
+            if endpoint_pbit or e%2==0:
+                pbit = read_bits(bits, offset, 1)
+                offset += 1
+            endpoints[:, e] = (endpoints[:, e] << 1) | pbit[:, None]
+        color_bits += 1
+        alpha_bits += alpha_bits>0
+
+    endpoints[:, :, :3] = expand_bits(endpoints[:, :, :3], color_bits)
+    if alpha_bits>0:
+        endpoints[:, :, 3] = expand_bits(endpoints[:, :, 3], alpha_bits)
+    else:
+        endpoints[:, :, 3] = 255
+
+    #8 bit values fit in int16 during interpolation
+    endpoints = endpoints.astype(np.int16)
+
+    #indices
+    anchors, subsets = get_subsets(partition, subset_num)
+    indices = read_indices(bits, offset, index_bits, anchors)
+    offset += index_bits*16 - subset_num
+    if index_bits2==0:
+        rgba = interpolate(endpoints, subsets, WEIGHTS[index_bits][indices])
+    else:
+        #mode 4 and 5 have separate indices for alpha
+        indices2 = read_indices(bits, offset, index_bits2, anchors)
+        weights = WEIGHTS[index_bits][indices]
+        weights2 = WEIGHTS[index_bits2][indices2]
+        swap = index_sel[:, None]==1
+        color_weights = np.where(swap, weights2, weights)
+        alpha_weights = np.where(swap, weights, weights2)
+        rgba = interpolate(endpoints, subsets, color_weights)
+        rgba[:, :, 3] = interpolate(endpoints[:, :, 3:], subsets, alpha_weights)[:, :, 0]
+
+        #rotation (1: swap A and R, 2: swap A and G, 3: swap A and B)
+        for r in range(1, 4):
+            rotated = rotation==r
+            rgba[rotated, :, r-1], rgba[rotated, :, 3] = rgba[rotated, :, 3], rgba[rotated, :, r-1].copy()
+
+    return rgba.astype(np.uint8)
+
+#BC7 blocks (N, 16) to RGBA8 (N, 16, 4)
+def decode_bc7(blocks):
+    rgba = np.zeros((len(blocks), 16, 4), dtype=np.uint8)
+    modes = BC7_MODE_TABLE[blocks[:, 0]]
+    for mode in range(8):
+        ids = np.nonzero(modes==mode)[0]
+        if len(ids)>0:
+            rgba[ids] = decode_bc7_mode(blocks[ids], mode)
+    return rgba
+
+#BC6H modes: mode bits, endpoint bits, delta bits (RGB), transformed, bit layout
+#(layout is a list of fields in stream order. 'r1:0-4' means r1[0], r1[1], ..., r1[4] and 'd' is the partition.)
+BC6H_MODES = {
+    0x00: (2, 10, (5, 5, 5), True, 'g2:4 b2:4 b3:4 r0:0-9 g0:0-9 b0:0-9 r1:0-4 g3:4 g2:0-3 g1:0-4 b3:0 g3:0-3 b1:0-4 b3:1 b2:0-3 r2:0-4 b3:2 r3:0-4 b3:3 d:0-4'),
+    0x01: (2, 7, (6, 6, 6), True, 'g2:5 g3:4 g3:5 r0:0-6 b3:0 b3:1 b2:4 g0:0-6 b2:5 b3:2 g2:4 b0:0-6 b3:3 b3:5 b3:4 r1:0-5 g2:0-3 g1:0-5 g3:0-3 b1:0-5 b2:0-3 r2:0-5 r3:0-5 d:0-4'),
+    0x02: (5, 11, (5, 4, 4), True, 'r0:0-9 g0:0-9 b0:0-9 r1:0-4 r0:10 g2:0-3 g1:0-3 g0:10 b3:0 g3:0-3 b1:0-3 b0:10 b3:1 b2:0-3 r2:0-4 b3:2 r3:0-4 b3:3 d:0-4'),
+    0x06: (5, 11, (4, 5, 4), True, 'r0:0-9 g0:0-9 b0:0-9 r1:0-3 r0:10 g3:4 g2:0-3 g1:0-4 g0:10 g3:0-3 b1:0-3 b0:10 b3:1 b2:0-3 r2:0-3 b3:0 b3:2 r3:0-3 g2:4 b3:3 d:0-4'),
+    0x0A: (5, 11, (4, 4, 5), True, 'r0:0-9 g0:0-9 b0:0-9 r1:0-3 r0:10 b2:4 g2:0-3 g1:0-3 g0:10 b3:0 g3:0-3 b1:0-4 b0:10 b2:0-3 r2:0-3 b3:1 b3:2 r3:0-3 b3:4 b3:3 d:0-4'),
+    0x0E: (5, 9, (5, 5, 5), True, 'r0:0-8 b2:4 g0:0-8 g2:4 b0:0-8 b3:4 r1:0-4 g3:4 g2:0-3 g1:0-4 b3:0 g3:0-3 b1:0-4 b3:1 b2:0-3 r2:0-4 b3:2 r3:0-4 b3:3 d:0-4'),
+    0x12: (5, 8, (6, 5, 5), True, 'r0:0-7 g3:4 b2:4 g0:0-7 b3:2 g2:4 b0:0-7 b3:3 b3:4 r1:0-5 g2:0-3 g1:0-4 b3:0 g3:0-3 b1:0-4 b3:1 b2:0-3 r2:0-5 r3:0-5 d:0-4'),
+    0x16: (5, 8, (5, 6, 5), True, 'r0:0-7 b3:0 b2:4 g0:0-7 g2:5 g2:4 b0:0-7 g3:5 b3:4 r1:0-4 g3:4 g2:0-3 g1:0-5 g3:0-3 b1:0-4 b3:1 b2:0-3 r2:0-4 b3:2 r3:0-4 b3:3 d:0-4'),
+    0x1A: (5, 8, (5, 5, 6), True, 'r0:0-7 b3:1 b2:4 g0:0-7 b2:5 g2:4 b0:0-7 b3:5 b3:4 r1:0-4 g3:4 g2:0-3 g1:0-4 b3:0 g3:0-3 b1:0-5 b2:0-3 r2:0-4 b3:2 r3:0-4 b3:3 d:0-4'),
+    0x1E: (5, 6, (6, 6, 6), False, 'r0:0-5 g3:4 b3:0 b3:1 b2:4 g0:0-5 g2:5 b2:5 b3:2 g2:4 b0:0-5 g3:5 b3:3 b3:5 b3:4 r1:0-5 g2:0-3 g1:0-5 g3:0-3 b1:0-5 b2:0-3 r2:0-5 r3:0-5 d:0-4'),
+    0x03: (5, 10, (10, 10, 10), False, 'r0:0-9 g0:0-9 b0:0-9 r1:0-9 g1:0-9 b1:0-9'),
+    0x07: (5, 11, (9, 9, 9), True, 'r0:0-9 g0:0-9 b0:0-9 r1:0-8 r0:10 g1:0-8 g0:10 b1:0-8 b0:10'),
+    0x0B: (5, 12, (8, 8, 8), True, 'r0:0-9 g0:0-9 b0:0-9 r1:0-7 r0:11-10 g1:0-7 g0:11-10 b1:0-7 b0:11-10'),
+    0x0F: (5, 16, (4, 4, 4), True, 'r0:0-9 g0:0-9 b0:0-9 r1:0-3 r0:15-10 g1:0-3 g0:15-10 b1:0-3 b0:15-10'),
+}
+
+#parse a layout string to {field: [(stream position, bit), ...]}
+def parse_bc6h_layout(mode_bits, layout):
+    fields = {}
+    offset = mode_bits
+    for token in layout.split(' '):
+        name, bits = token.split(':')
+        if '-' in bits:
+            first, last = [int(b) for b in bits.split('-')]
+            step = 1 if first<=last else -1
+            bits = range(first, last+step, step)
+        else:
+            bits = [int(bits)]
+        for bit in bits:
+            fields.setdefault(name, []).append((offset, bit))
+            offset += 1
+    return fields
+
+BC6H_LAYOUTS = {mode: parse_bc6h_layout(info[0], info[4]) for mode, info in BC6H_MODES.items()}
+
+#mode of BC6H block (2 bits when the lower bits are 00 or 01, otherwise 5 bits)
+BC6H_MODE_TABLE = np.array([i & 3 if (i & 3)<2 else i & 31 for i in range(256)], dtype=np.uint8)
+
+def sign_extend(x, bit_num):
+    sign = 1 << (bit_num-1)
+    return (x ^ sign) - sign
+
+#endpoints to 16 bit values
+def unquantize(x, bit_num, signed):
+    if signed:
+        if bit_num>=16:
+            return x
+        sign = x<0
+        x = np.abs(x)
+        unq = ((x << 15) + 0x4000) >> (bit_num-1)
+        unq = np.where(x==0, 0, np.where(x >= (1<<(bit_num-1))-1, 0x7FFF, unq))
+        return np.where(sign, -unq, unq)
+    if bit_num>=15:
+        return x
+    unq = ((x << 16) + 0x8000) >> bit_num
+    return np.where(x==0, 0, np.where(x==(1<<bit_num)-1, 0xFFFF, unq))
+
+#interpolated values to half float bits
+def finish_unquantize(x, signed):
+    if signed:
+        half = (np.abs(x)*31) >> 5
+        return np.where(x<0, half | 0x8000, half)
+    return (x*31) >> 6
+
+def decode_bc6h_mode(blocks, mode, signed):
+    _, endpoint_bits, delta_bits, transformed, _ = BC6H_MODES[mode]
+    layout = BC6H_LAYOUTS[mode]
+    bits = unpack_bits(blocks).astype(np.int32)
+    subset_num = 2 if 'd' in layout else 1
+
+    def read_field(name):
+        value = np.zeros(len(blocks), dtype=np.int32)
+        for offset, bit in layout.get(name, []):
+            value |= bits[:, offset] << bit
+        return value
+
+    #endpoints (N, subset_num*2, RGB)
+    endpoints = np.stack([
+        np.stack([read_field(c+str(e)) for c in 'rgb'], axis=-1) for e in range(subset_num*2)
+    ], axis=1)
+
+    if signed:
+        endpoints[:, 0] = sign_extend(endpoints[:, 0], endpoint_bits)
+    for c in range(3):
+        if transformed:
+            #other endpoints are deltas from the 1st one
+            delta = sign_extend(endpoints[:, 1:, c], delta_bits[c])
+            endpoints[:, 1:, c] = (endpoints[:, :1, c] + delta) & ((1<<endpoint_bits)-1)
+            if signed:
+                endpoints[:, 1:, c] = sign_extend(endpoints[:, 1:, c], endpoint_bits)
+        elif signed:
+            endpoints[:, 1:, c] = sign_extend(endpoints[:, 1:, c], endpoint_bits)
+    endpoints = unquantize(endpoints, endpoint_bits, signed)
+
+    #indices
+    partition = read_field('d')
+    anchors, subsets = get_subsets(partition, subset_num)
+    index_bits = 3 if subset_num==2 else 4
+    indices = read_indices(bits, 128 - index_bits*16 + subset_num, index_bits, anchors)
+    rgb = interpolate(endpoints, subsets, WEIGHTS[index_bits][indices])
+    return finish_unquantize(rgb, signed).astype(np.uint16)
+
+#BC6H blocks (N, 16) to float16 RGB (N, 16, 3) (reserved modes are decoded as black)
+def decode_bc6h(blocks, signed=False):
+    rgb = np.zeros((len(blocks), 16, 3), dtype=np.uint16)
+    modes = BC6H_MODE_TABLE[blocks[:, 0]]
+    for mode in BC6H_MODES:
+        ids = np.nonzero(modes==mode)[0]
+        if len(ids)>0:
+            rgb[ids] = decode_bc6h_mode(blocks[ids], mode, signed)
+    return rgb.view(np.float16)
+
+def decode_bc6h_signed(blocks):
+    return decode_bc6h(blocks, signed=True)
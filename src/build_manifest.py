@@ -0,0 +1,63 @@
+import os, json
+
+'''
+Build manifest for txt mode
+
+a json file in the save folder which has sizes and mtimes of inputs and outputs of each injection.
+re-running txt mode skips pairs which inputs, outputs and options have not changed.
+'''
+
+MANIFEST_FILE = 'build_manifest.json'
+MANIFEST_VERSION = 1
+
+#get [size, mtime] of a file (None if the file does not exist)
+def get_stat(file):
+    if not os.path.exists(file):
+        return None
+    st = os.stat(file)
+    return [st.st_size, st.st_mtime_ns]
+
+def get_stats(files):
+    return {os.path.abspath(f): get_stat(f) for f in files}
+
+class BuildManifest:
+    def __init__(self, file):
+        self.file = file
+        self.builds = {} #key: {'inputs': stats, 'outputs': stats, 'options': options}
+        if os.path.exists(file):
+            try:
+                with open(file, 'r') as f:
+                    manifest = json.load(f)
+                if manifest.get('version')==MANIFEST_VERSION:
+                    self.builds = manifest['builds']
+            except (ValueError, KeyError):
+                print('Warning: {} is broken. All files will be rebuilt.'.format(file))
+
+    #check if inputs and options are the same as the last build and its outputs are not changed
+    def is_up_to_date(self, key, inputs, options):
+        build = self.builds.get(key)
+        if build is None or build['options']!=options:
+            return False
+        if build['inputs']!=get_stats(inputs):
+            return False
+        for file, stat in build['outputs'].items():
+            if stat is None or get_stat(file)!=stat:
+                return False
+        return True
+
+    #record a build (call it after writing outputs)
+    def update(self, key, inputs, outputs, options):
+        self.builds[key] = {'inputs': get_stats(inputs), 'outputs': get_stats(outputs), 'options': options}
+
+    def remove(self, key):
+        self.builds.pop(key, None)
+
+    def save(self):
+        folder = os.path.dirname(self.file)
+        if folder not in ['.', ''] and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        #write to a temporary file and replace the manifest not to break it
+        temp = self.file + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'builds': self.builds}, f, indent=2)
+        os.replace(temp, self.file)
@@ -0,0 +1,22 @@
+import sys
+from server import submit
+
+'''
+Client for serve mode
+
+usage: client.py <arguments for main.py>
+       client.py --stop
+       (or main.py --client <arguments>)
+'''
+
+#send arguments to the server and return the exit code
+def run_client(argv):
+    try:
+        error = submit(argv, stop=argv==['--stop'])
+    except RuntimeError as e:
+        error = str(e)
+        print('Error: {}'.format(error))
+    return 1 if error else 0
+
+if __name__=='__main__':
+    sys.exit(run_client(sys.argv[1:]))
@@ -1,5 +1,6 @@
-import os, argparse
+import os, io, argparse, struct
 from io_util import *
+from profiler import PROFILER
 from texture_asset import BYTE_PER_PIXEL
 
 DDS_FORMAT = {
@@ -18,10 +19,26 @@ def get_dds_format(form):
     for k in DDS_FORMAT:
         if form in DDS_FORMAT[k]:
             return k
-    raise RuntimeError('Unsupported DDS format. ({})'.format(form))
-
-class DDSHeader:
+    raise UnsupportedError('Unsupported DDS format. ({})'.format(form))
+
+#sizes of mipmaps in dds
+def get_mipmap_sizes(width, height, mipmap_num):
+    sizes = []
+    for i in range(mipmap_num):
+        #mipmap sizes are multiples of 4
+        if height%4!=0:
+            height+=4-height%4
+        if width%4!=0:
+            width+=4-width%4
+        sizes.append([width, height])
+        height = height//2
+        width = width//2
+    return sizes
+
+class DDSHeader: #128 bytes (+20 bytes for DX10)
     MAGIC = b'\x44\x44\x53\x20'
+    LAYOUT = struct.Struct('<4s7I44s2I4s20s5I')
+    DX10_LAYOUT = struct.Struct('<5I')
 
     def __init__(self, width, height, mipmap_num, format_name):
         self.width = width
@@ -32,34 +49,29 @@ class DDSHeader:
 
     #read header
     def read(f):
+        f = BinaryReader(f.read(DDSHeader.LAYOUT.size+DDSHeader.DX10_LAYOUT.size))
         head = f.read(4)             #Magic=='DDS '
         check(head, DDSHeader.MAGIC, msg='Not DDS.')
-        read_const_uint32(f, 124)    #Size==124
-        f.seek(4,1)                  #Flags
-        height = read_uint32(f)      #Height
-        width = read_uint32(f)       #Width
-        f.seek(8,1)                  #PitchOrLinearSize, Depth
-        mipmap_num = read_uint32(f)  #MipMapCount
-        mipmap_num += mipmap_num==0
-        f.seek(44, 1)                #Reserved1[11]
-        read_const_uint32(f, 32)     #PfSize==32
-        f.seek(4, 1)                 #PfFlags==4
-        fourCC=f.read(4).decode()    #FourCC
-        f.seek(40, 1)                #BitCount, BitMask
-                                     #Caps, Caps2, ReservedCaps[2], Reserved2
+        f.seek(0)
+        (head, size, flags, height, width, pitch, depth, mipmap_num,
+         reserved1, pf_size, pf_flags, fourCC, bit_mask,
+         caps, caps2, caps3, caps4, reserved2) = f.unpack(DDSHeader.LAYOUT)
+        check(size, 124)             #Size==124
+        mipmap_num += mipmap_num==0  #MipMapCount
+        check(pf_size, 32)           #PfSize==32
+        fourCC = fourCC.decode()     #FourCC
         
         #DXT10 header
         if fourCC=='DX10':
-            dxgi_format=read_uint32(f)      #dxgiFormat
-            l = read_uint32_array(f, len=3) #resourceDimension==3
-            check(l, [3,0,1])               #miscFlag==0
-                                            #arraySize==1
-            f.seek(4, 1)                    #miscFlag2
+            dxgi_format, dimension, misc_flag, array_size, misc_flag2 = f.unpack(DDSHeader.DX10_LAYOUT)
+            check([dimension, misc_flag, array_size], [3,0,1]) #resourceDimension==3
+                                                                #miscFlag==0
+                                                                #arraySize==1
         else:
             dxgi_format=fourCC
         
         format_name = get_dds_format(dxgi_format)
-        return DDSHeader(width, height, mipmap_num, format_name)
+        return DDSHeader(width, height, mipmap_num, format_name), f.tell()
 
     #write header
     def write(f, header):
@@ -70,47 +82,21 @@ class DDSHeader:
         else:
             fourCC='DX10'
 
-        f.write(DDSHeader.MAGIC)
-        write_uint32(f, 124) #Size==124
-
-        #flags
-        write_uint8(f, 7)
-        write_uint8(f, 16)
-        write_uint8(f, 8+2*(mipmap_num>1))
-        write_uint8(f, 0)
-
-        write_uint32(f, header.height)
-        write_uint32(f, header.width)
-
-        #PitchOrLinearSize
-        write_uint32(f, int(header.width*header.height*header.byte_per_pixel))
-
-        write_uint32(f, 1) #Depth
-        write_uint32(f, mipmap_num)
-
-        #Reserved1[11]
-        write_null_array(f, 9)
-        f.write('FF7R'.encode())
-        write_null(f)
-
-        write_uint32(f, 32) #PfSize==32
-        write_uint32(f, 4) #PfFlags
-        f.write(fourCC.encode()) #fourCC
-        write_null_array(f, 5) #BitCount, BitMask
-
-        #caps
-        write_uint8(f, (mipmap_num>1)*8)
-        write_uint8(f, 16)
-        write_uint8(f, (mipmap_num>1)*64)
-        write_uint8(f, 0)
-
-        write_null_array(f ,4) #caps2, reservedCaps, reserved2
+        has_mips = mipmap_num>1
+        flags = bytes([7, 16, 8+2*has_mips, 0])
+        caps = bytes([has_mips*8, 16, has_mips*64, 0])
+        f.write(DDSHeader.LAYOUT.pack(
+            DDSHeader.MAGIC, 124, int.from_bytes(flags, 'little'), #Magic, Size, Flags
+            header.height, header.width,
+            int(header.width*header.height*header.byte_per_pixel), #PitchOrLinearSize
+            1, mipmap_num,                                         #Depth, MipMapCount
+            bytes(36)+'FF7R'.encode()+bytes(4),                    #Reserved1[11]
+            32, 4, fourCC.encode(), bytes(20),                     #PfSize, PfFlags, FourCC, BitCount, BitMask
+            int.from_bytes(caps, 'little'), 0, 0, 0, 0))           #Caps, Caps2, ReservedCaps[2], Reserved2
 
         #write dxt10 header
         if fourCC=='DX10':
-            write_uint32(f, dxgi_format)
-            write_uint32_array(f, [3,0,1])
-            write_uint32(f, 0)
+            f.write(DDSHeader.DX10_LAYOUT.pack(dxgi_format, 3, 0, 1, 0))
 
     def print(self):
         print('  height: {}'.format(self.height))
@@ -126,35 +112,42 @@ class DDS:
         self.mipmap_size = mipmap_size
 
     #load dds file
-    def load(file, verbose=False):
+    def load(file, verbose=False, lazy=False):
         if file[-3:] not in ['dds', 'DDS']:
             raise RuntimeError('Not DDS.')
         print('load: ' + file)
         with open(file, 'rb') as f:
+            return DDS.read(f, verbose=verbose, lazy=lazy)
+
+    #make dds from a bytes-like object
+    def from_bytes(buf, verbose=False):
+        return DDS.read(io.BytesIO(buf), verbose=verbose)
+
+    #read dds from a stream (lazy: refer to mipmap data in the file instead of reading it)
+    def read(f, verbose=False, lazy=False):
+        with PROFILER.stage('dds read') as stage:
+            start = f.tell()
             #read header
-            header = DDSHeader.read(f)
+            header, header_size = DDSHeader.read(f)
+            f.seek(start+header_size)
 
             mipmap_num = header.mipmap_num
             byte_per_pixel = header.byte_per_pixel
-            height = header.height
-            width = header.width
             mipmap_data = []
             mipmap_size = []
 
             #read mipmaps
-            for i in range(mipmap_num):
+            for i, (width, height) in enumerate(get_mipmap_sizes(header.width, header.height, mipmap_num)):
 
-                #mipmap sizes are multiples of 4
-                if height%4!=0:
-                    height+=4-height%4
-                if width%4!=0:
-                    width+=4-width%4
-                
                 #read mipmap data
                 size = height*width*byte_per_pixel
                 if size!=int(size):
                     raise RuntimeError('The size of mipmap data is not int. This is unexpected.')
-                data = f.read(int(size))
+                if lazy:
+                    data = FileRange(f.name, f.tell(), int(size))
+                    f.seek(int(size), 1)
+                else:
+                    data = f.read(int(size))
                 
                 #print mipmap info
                 if verbose:
@@ -164,11 +157,10 @@ class DDS:
                 #store mipmap data
                 mipmap_data.append(data)
                 mipmap_size.append([int(width), int(height)])
-                height = height//2
-                width = width//2
 
             header.print()
             check(f.tell(), get_size(f), msg='Parse Failed. This is unexpected.')
+            stage.size += f.tell()-start
 
         return DDS(header, mipmap_data, mipmap_size)
             
@@ -203,10 +195,30 @@ class DDS:
         if folder not in ['.', ''] and not os.path.exists(folder):
             mkdir(folder)
 
+        unlink_staged(file)
         with open(file, 'wb') as f:
+            self.write(f)
+
+    #write dds to a stream
+    def write(self, f):
+        if not is_seekable(f):
+            #tell() is used to measure the size
+            buf = io.BytesIO()
+            self.write(buf)
+            f.write(buf.getbuffer())
+            return
+        with PROFILER.stage('dds write') as stage:
+            start = f.tell()
             #write header
             DDSHeader.write(f, self.header)
 
             #write mipmap data
             for d in self.mipmap_data:
-                f.write(d)
+                write_data(f, d)
+            stage.size += f.tell()-start
+
+    #serialize dds to bytes
+    def to_bytes(self):
+        f = io.BytesIO()
+        self.write(f)
+        return f.getvalue()
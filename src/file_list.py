@@ -1,4 +1,4 @@
-import os
+import os, fnmatch
 
 '''
 format
@@ -70,12 +70,97 @@ def get_file_list_from_folder(folder):
     return directory, file_list
 
 def get_file_list_rec(folder):
-    file_list=[]
-    for file in sorted(os.listdir(folder)):
-        file_path = os.path.join(folder, file)
-        if os.path.isdir(file_path):
-            file_list+=[os.path.join(file, f) for f in get_file_list_rec(file_path)]
-        else:
-            file_list.append(file)
-    return file_list
+    return sorted(walk_files(folder))
 
+#check if a relative path or its file name matches one of glob patterns
+def match_globs(rel_path, name, patterns):
+    rel_path = rel_path.replace(os.sep, '/')
+    for pattern in patterns:
+        if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+#yield relative paths of files in a folder and its subfolders without listing the whole tree
+#exts: extensions of files to yield (e.g. ['.uexp', '.dds'])
+#include, exclude: glob patterns for relative paths or file names (excluded folders are not scanned.)
+def walk_files(folder, exts=None, include=None, exclude=None):
+    if exts is not None:
+        exts = [ext.lower() for ext in exts]
+    dirs = ['']
+    #folders already scanned (symlinks can make loops)
+    st = os.stat(folder)
+    visited = set([(st.st_dev, st.st_ino)])
+    while len(dirs)>0:
+        rel_dir = dirs.pop()
+        sub_dirs = []
+        with os.scandir(os.path.join(folder, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if exclude and match_globs(rel_path, entry.name, exclude):
+                    continue
+                if entry.is_dir():
+                    #(DirEntry.stat has no inode number on Windows)
+                    st = os.stat(entry.path)
+                    if (st.st_dev, st.st_ino) not in visited:
+                        visited.add((st.st_dev, st.st_ino))
+                        sub_dirs.append(rel_path)
+                    continue
+                if exts is not None and os.path.splitext(entry.name)[1].lower() not in exts:
+                    continue
+                if include and not match_globs(rel_path, entry.name, include):
+                    continue
+                yield rel_path
+        #scan subfolders in alphabetical order
+        dirs += sorted(sub_dirs, reverse=True)
+
+#walk a folder for batch modes (file paths are relative to the parent of the folder)
+def walk_folder(folder, exts=None, include=None, exclude=None):
+    directory, base = get_base_folder(folder)
+    files = walk_files(folder, exts=exts, include=include, exclude=exclude)
+    return directory, (os.path.join(base, file) for file in files)
+
+
+#index of uexp files in a folder (base name -> relative path)
+class UexpIndex:
+    def __init__(self, folder):
+        self.folder = folder
+        self.files = {}      #base name: relative path
+        self.collisions = {} #base name: relative paths of the same name assets
+        if os.path.exists(folder):
+            for file in walk_files(folder, exts=['.uexp']):
+                self.add(file)
+
+    #add a uexp file (relative path from the folder)
+    def add(self, file):
+        name = os.path.splitext(os.path.basename(file))[0]
+        if name not in self.files:
+            self.files[name] = file
+        elif self.files[name]!=file:
+            paths = self.collisions.setdefault(name, [self.files[name]])
+            if file not in paths:
+                paths.append(file)
+
+    #get uexp for dds (the same name asset, or the only asset in the folder)
+    def find(self, dds_file):
+        if len(self.files)==0:
+            raise RuntimeError('Uasset Not Found.')
+        if len(self.files)==1 and len(self.collisions)==0:
+            return list(self.files.values())[0]
+        name = os.path.splitext(os.path.basename(dds_file))[0]
+        if name in self.collisions:
+            raise RuntimeError('Some assets have the same name as dds. ({})'.format(', '.join(self.collisions[name])))
+        if name not in self.files:
+            raise RuntimeError('The same name asset as dds not found. {}'.format(name))
+        return self.files[name]
+
+    #raise an error if dds files will be injected into assets with the same name
+    def check_collisions(self, dds_list):
+        names = set([os.path.splitext(os.path.basename(file))[0] for file in dds_list])
+        names = sorted(names & set(self.collisions))
+        if len(names)==0:
+            return
+        for name in names:
+            print('Name collision: {}'.format(name))
+            for file in self.collisions[name]:
+                print('  {}'.format(os.path.join(self.folder, file)))
+        raise RuntimeError('Some assets in {} have the same name. ({})'.format(self.folder, ', '.join(names)))
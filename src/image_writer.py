@@ -0,0 +1,45 @@
+import os, zlib, struct
+import numpy as np
+from io_util import mkdir
+
+'''
+Writers for RGBA8 arrays (height, width, 4)
+'''
+
+def png_chunk(chunk_type, data):
+    chunk = chunk_type + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk))
+
+def save_png(file, rgba, level=6):
+    height, width, _ = rgba.shape
+    #each row starts with filter type (0: None)
+    raw = np.zeros((height, width*4+1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width*4)
+
+    with open(file, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        f.write(png_chunk(b'IDAT', zlib.compress(raw.tobytes(), level)))
+        f.write(png_chunk(b'IEND', b''))
+
+def save_tga(file, rgba):
+    height, width, _ = rgba.shape
+    with open(file, 'wb') as f:
+        #uncompressed true color, 32 bit, 8 bit alpha, top-left origin
+        f.write(struct.pack('<BBBHHBHHHHBB', 0, 0, 2, 0, 0, 0, 0, 0, width, height, 32, 0x28))
+        f.write(rgba[:, :, [2, 1, 0, 3]].tobytes())
+
+IMAGE_WRITERS = {
+    'png': save_png,
+    'tga': save_tga,
+}
+
+#save RGBA8 array as png or tga
+def save_image(file, rgba):
+    ext = os.path.splitext(file)[1][1:].lower()
+    if ext not in IMAGE_WRITERS:
+        raise RuntimeError('Unsupported image format. ({})'.format(ext))
+    folder = os.path.dirname(file)
+    if folder not in ['.', ''] and not os.path.exists(folder):
+        mkdir(folder)
+    IMAGE_WRITERS[ext](file, rgba)
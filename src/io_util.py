@@ -1,8 +1,57 @@
-import os
+import os, io, struct, hashlib, errno, shutil
+from profiler import PROFILER
+try:
+    import fcntl
+except ImportError:
+    #not available on Windows
+    fcntl = None
 
 def mkdir(dir):
     os.makedirs(dir, exist_ok=True)
 
+#ioctl to share data blocks between files (btrfs, xfs, etc.)
+FICLONE = 0x40049409
+
+#make a copy-on-write clone of a file
+def reflink(src, dst):
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'reflink is not supported.')
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
+
+#put a file to a folder without copying data if possible. (returns the method)
+#staged files should be removed instead of overwritten. (see unlink_staged)
+def stage_file(src, dst):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        reflink(src, dst)
+        return 'reflink'
+    except OSError:
+        pass
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.abspath(src), dst)
+        return 'symlink'
+    except (OSError, NotImplementedError):
+        pass
+    shutil.copy(src, dst)
+    return 'copy'
+
+#remove a hardlink or symlink before writing to its path so that the source file is not changed
+def unlink_staged(file):
+    if os.path.islink(file) or (os.path.exists(file) and os.stat(file).st_nlink>1):
+        os.remove(file)
+
 def get_size(file):
     pos=file.tell()
     file.seek(0,2)
@@ -10,138 +59,363 @@ def get_size(file):
     file.seek(pos)
     return size
 
-def check(actual, expected, f=None, msg=''):
+#error for assets the tool does not support (version, format, exports)
+class UnsupportedError(RuntimeError):
+    pass
+
+def check(actual, expected, f=None, msg='', error=RuntimeError):
     if actual!=expected:
         if f is not None:
             print('offset: {}'.format(f.tell()))
         print('actual: {}'.format(actual))
         print('expected: {}'.format(expected))
-        raise RuntimeError(msg)
-
-def read_uint32(file):
-    bin=file.read(4)
-    return int.from_bytes(bin, "little")
-
-def read_uint16(file):
-    bin=file.read(2)
-    return int.from_bytes(bin, "little")
-
-def read_uint8(file):
-    bin=file.read(1)
-    return int(bin[0])
-
-def read_int32(file):
-    bin=file.read(4)
-    return int.from_bytes(bin, "little", signed=True)
-
-def read_array(file, read_func, len=None):
-    if len is None:
-        len = read_uint32(file)
-    ary=[read_func(file) for i in range(len)]
-    return ary
-
-def read_uint32_array(file, len=None):
-    return read_array(file, read_uint32, len=len)
-
-def read_uint16_array(file, len=None):
-    return read_array(file, read_uint16, len=len)
-
-def read_uint8_array(file, len=None):
-    return read_array(file, read_uint8, len=len)
-
-def read_int32_array(file, len=None):
-    return read_array(file, read_int32, len=len)
-
-def read_str(file):
-    num = read_uint32(file)
-    if num==0:
+        raise error(msg)
+
+COPY_CHUNK_SIZE = 0x100000
+
+#errors that mean the kernel can not copy data between the files (use read and write instead.)
+KERNEL_COPY_ERRORS = [errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSOCK]
+
+#copy a byte range between files in the kernel with copy_file_range or sendfile
+#returns the number of copied bytes (0 if the kernel calls are not supported.)
+def kernel_copy(src_fd, src_offset, dst_fd, dst_offset, size):
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied<size:
+                n = os.copy_file_range(src_fd, dst_fd, size-copied, src_offset+copied, dst_offset+copied)
+                if n==0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_ERRORS:
+                raise
+    if hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dst_fd, dst_offset+copied, os.SEEK_SET)
+            while copied<size:
+                n = os.sendfile(dst_fd, src_fd, src_offset+copied, size-copied)
+                if n==0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_ERRORS:
+                raise
+    return copied
+
+#get file descriptor of a stream (None for in-memory streams)
+def get_fileno(f):
+    try:
+        return f.fileno()
+    except (AttributeError, OSError, ValueError):
         return None
-    string = file.read(num-1).decode()
-    file.seek(1,1)
-    return string
-
-def read_const_uint32(f, n, msg='Unexpected Value!'):
-    const = read_uint32(f)
-    check(const, n, f, msg)
-
-def read_null(f, msg='Not NULL!'):
-    read_const_uint32(f, 0, msg)
-
-def read_null_array(f, len, msg='Not NULL!'):
-    null=read_uint32_array(f, len=len)
-    check(null, [0]*len, f, msg)
-
-def write_uint32(file, n):
-    bin = n.to_bytes(4, byteorder="little")
-    file.write(bin)
 
-def write_uint16(file, n):
-    bin = n.to_bytes(2, byteorder="little")
-    file.write(bin)
-
-def write_uint8(file, n):
-    bin = n.to_bytes(1, byteorder="little")
-    file.write(bin)
-
-def write_int32(file, n):
-    bin = n.to_bytes(4, byteorder="little", signed=True)
-    file.write(bin)
-
-def write_array(file, ary, write_func, with_length=False):
-    if with_length:
-        write_uint32(file, len(ary))
-    for a in ary:
-        write_func(file, a)
-
-def write_uint32_array(file, ary, with_length=False):
-    write_array(file, ary, write_uint32, with_length=with_length)
-
-def write_uint16_array(file, ary, with_length=False):
-    write_array(file, ary, write_uint16, with_length=with_length)
-
-def write_uint8_array(file, ary, with_length=False):
-    write_array(file, ary, write_uint8, with_length=with_length)
-
-def write_int32_array(file, ary, with_length=False):
-    write_array(file, ary, write_int32, with_length=with_length)
-
-def write_str(file, s):
-    num = len(s)+1
-    write_uint32(file, num)
-    str_byte = s.encode()
-    file.write(str_byte + b'\x00')
-
-def write_null(f):
-    write_uint32(f, 0)
-
-def write_null_array(f, len):
-    write_uint32_array(f, [0]*len)
-
-def compare(file1,file2):
-    f1=open(file1, 'rb')
-    f2=open(file2, 'rb')
-    print('Comparing {} and {}...'.format(file1, file2))
-
-    f1_size=get_size(f1)
-    f2_size=get_size(f2)
-    
-    size=min(f1_size, f2_size)
-    i=0
-    f1_bin=f1.read()
-    f2_bin=f2.read()
-    f1.close()
-    f2.close()
-
-    i=-1
-    for b1, b2 in zip(f1_bin, f2_bin):
-        i+=1
-        if b1!=b2:
-            break
-  
-    if i==size-1:
-        print('Same data!')
+#byte range of a file. (data will be read when it is accessed.)
+class FileRange:
+    def __init__(self, file, offset, size):
+        self.file = file
+        self.offset = offset
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __bytes__(self):
+        return self.read()
+
+    def read(self):
+        with open(self.file, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(self.size)
+        check(len(data), self.size, msg='Unexpected end of file. ({})'.format(self.file))
+        return data
+
+    #copy data to a file. (in the kernel if possible, or chunk by chunk)
+    def write_to(self, f):
+        if isinstance(f, BinaryWriter):
+            f = f.file
+        with open(self.file, 'rb') as src:
+            copied = 0
+            fd = get_fileno(f)
+            if fd is not None:
+                f.flush()
+                pos = f.tell()
+                copied = kernel_copy(src.fileno(), self.offset, fd, pos, self.size)
+                f.seek(pos+copied)
+            src.seek(self.offset+copied)
+            rest = self.size-copied
+            while rest>0:
+                data = src.read(min(rest, COPY_CHUNK_SIZE))
+                if len(data)==0:
+                    raise RuntimeError('Unexpected end of file. ({})'.format(self.file))
+                f.write(data)
+                rest -= len(data)
+
+#write bytes, memoryview or FileRange
+def write_data(f, data):
+    if isinstance(data, FileRange):
+        data.write_to(f)
     else:
-        raise RuntimeError('Not same :{}'.format(i))
+        f.write(data)
+
+#struct layouts for scalars
+UINT8 = struct.Struct('<B')
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+INT32 = struct.Struct('<i')
+
+#struct layouts for arrays (type, length -> Struct)
+ARRAY_LAYOUTS = {}
+
+def get_array_layout(type, len):
+    layout = ARRAY_LAYOUTS.get((type, len))
+    if layout is None:
+        layout = struct.Struct('<{}{}'.format(len, type))
+        ARRAY_LAYOUTS[(type, len)] = layout
+    return layout
+
+#check if tell() and seek() can be used for a stream (pipes and sockets can not)
+def is_seekable(f):
+    if isinstance(f, BinaryWriter):
+        f = f.file
+    try:
+        return f.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+#reader for bytes, bytearray, memoryview or mmap
+class BinaryReader:
+    def __init__(self, buf, offset=0):
+        self.buf = buf
+        self.offset = offset
+        self.size = len(buf)
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, offset, whence=0):
+        if whence==0:
+            self.offset = offset
+        elif whence==1:
+            self.offset += offset
+        else:
+            self.offset = self.size + offset
+        return self.offset
+
+    def read(self, size=-1):
+        if size<0 or self.offset+size>self.size:
+            size = max(self.size-self.offset, 0)
+        data = bytes(self.buf[self.offset:self.offset+size])
+        self.offset += size
+        return data
+
+    #read data without copying it
+    def read_view(self, size):
+        if self.offset+size>self.size:
+            raise RuntimeError('Unexpected end of data. (offset: {}, size: {})'.format(self.offset, size))
+        view = memoryview(self.buf)[self.offset:self.offset+size]
+        self.offset += size
+        return view
+
+    def unpack(self, layout):
+        values = layout.unpack_from(self.buf, self.offset)
+        self.offset += layout.size
+        return values
+
+    #unpack an array of records with one call
+    def unpack_array(self, layout, len):
+        view = self.read_view(layout.size*len)
+        return list(layout.iter_unpack(view))
+
+    def read_uint32(self):
+        return self.unpack(UINT32)[0]
+
+    def read_uint16(self):
+        return self.unpack(UINT16)[0]
+
+    def read_uint8(self):
+        return self.unpack(UINT8)[0]
+
+    def read_int32(self):
+        return self.unpack(INT32)[0]
+
+    def read_array(self, type, len=None):
+        if len is None:
+            len = self.read_uint32()
+        return list(self.unpack(get_array_layout(type, len)))
+
+    def read_uint32_array(self, len=None):
+        return self.read_array('I', len=len)
+
+    def read_uint16_array(self, len=None):
+        return self.read_array('H', len=len)
+
+    def read_uint8_array(self, len=None):
+        return self.read_array('B', len=len)
+
+    def read_int32_array(self, len=None):
+        return self.read_array('i', len=len)
+
+    def read_str(self):
+        num = self.read_uint32()
+        if num==0:
+            return None
+        string = self.read(num-1).decode()
+        self.offset += 1
+        return string
+
+    def read_const_uint32(self, n, msg='Unexpected Value!'):
+        const = self.read_uint32()
+        check(const, n, self, msg)
+
+    def read_null(self, msg='Not NULL!'):
+        self.read_const_uint32(0, msg)
+
+    def read_null_array(self, len, msg='Not NULL!'):
+        null = self.read_uint32_array(len=len)
+        check(null, [0]*len, self, msg)
+
+#writer for files or an in-memory buffer
+class BinaryWriter:
+    def __init__(self, file=None):
+        if file is None:
+            file = io.BytesIO()
+        self.file = file
+
+    def tell(self):
+        return self.file.tell()
+
+    def write(self, data):
+        self.file.write(data)
+
+    def getvalue(self):
+        return self.file.getvalue()
+
+    def pack(self, layout, *values):
+        self.file.write(layout.pack(*values))
+
+    def write_uint32(self, n):
+        self.pack(UINT32, n)
+
+    def write_uint16(self, n):
+        self.pack(UINT16, n)
+
+    def write_uint8(self, n):
+        self.pack(UINT8, n)
+
+    def write_int32(self, n):
+        self.pack(INT32, n)
+
+    def write_array(self, type, ary, with_length=False):
+        if with_length:
+            self.write_uint32(len(ary))
+        self.file.write(get_array_layout(type, len(ary)).pack(*ary))
+
+    def write_uint32_array(self, ary, with_length=False):
+        self.write_array('I', ary, with_length=with_length)
+
+    def write_uint16_array(self, ary, with_length=False):
+        self.write_array('H', ary, with_length=with_length)
+
+    def write_uint8_array(self, ary, with_length=False):
+        self.write_array('B', ary, with_length=with_length)
+
+    def write_int32_array(self, ary, with_length=False):
+        self.write_array('i', ary, with_length=with_length)
+
+    def write_str(self, s):
+        str_byte = s.encode()
+        self.write_uint32(len(str_byte)+1)
+        self.file.write(str_byte + b'\x00')
+
+    def write_null(self):
+        self.write_uint32(0)
+
+    def write_null_array(self, len):
+        self.file.write(bytes(4*len))
+
+#chunk size for compare
+COMPARE_CHUNK_SIZE = 0x400000
+
+#offset of the first different byte in two chunks (binary search)
+def find_first_difference(bin1, bin2):
+    low = 0
+    high = min(len(bin1), len(bin2))
+    if bin1[:high]==bin2[:high]:
+        return high
+    #bin1[:low]==bin2[:low] and bin1[low:high]!=bin2[low:high]
+    while high-low>1:
+        mid = (low+high)//2
+        if bin1[low:mid]==bin2[low:mid]:
+            low = mid
+        else:
+            high = mid
+    return low
+
+#sha256 digest of a file
+def get_digest(file):
+    hash = hashlib.sha256()
+    with open(file, 'rb') as f:
+        while True:
+            chunk = f.read(COMPARE_CHUNK_SIZE)
+            if not chunk:
+                break
+            hash.update(chunk)
+    return hash.hexdigest()
+
+#compare two streams chunk by chunk. (raise an error with the offset of the first difference)
+def compare_streams(f1, f2, stage):
+    offset = 0
+    while True:
+        bin1 = f1.read(COMPARE_CHUNK_SIZE)
+        bin2 = f2.read(COMPARE_CHUNK_SIZE)
+        stage.size += len(bin1) + len(bin2)
+        if bin1!=bin2:
+            raise RuntimeError('Not same :{}'.format(offset + find_first_difference(bin1, bin2)))
+        if len(bin1)==0:
+            break
+        offset += len(bin1)
 
+#compare two files. (use_hash: compare sha256 digests instead of the data)
+def compare(file1, file2, use_hash=False):
+    print('Comparing {} and {}...'.format(file1, file2))
+    f1_size = os.path.getsize(file1)
+    f2_size = os.path.getsize(file2)
     if f1_size!=f2_size:
-        raise RuntimeError('Not same size. ({}, {})'.format(f1_size, f2_size))
\ No newline at end of file
+        raise RuntimeError('Not same size. ({}, {})'.format(f1_size, f2_size))
+
+    with PROFILER.stage('compare') as stage:
+        if use_hash:
+            digest1 = get_digest(file1)
+            digest2 = get_digest(file2)
+            stage.size += f1_size + f2_size
+            if digest1!=digest2:
+                raise RuntimeError('Not same digest. ({}, {})'.format(digest1, digest2))
+            print('Same data! (sha256: {})'.format(digest1))
+            return
+
+        with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
+            compare_streams(f1, f2, stage)
+    print('Same data!')
+
+#compare a file with data in memory. (no temporary files)
+def compare_with_buffer(file, buf, use_hash=False):
+    print('Comparing {} and the rebuilt data...'.format(file))
+    file_size = os.path.getsize(file)
+    if file_size!=len(buf):
+        raise RuntimeError('Not same size. ({}, {})'.format(file_size, len(buf)))
+
+    with PROFILER.stage('compare') as stage:
+        if use_hash:
+            digest1 = get_digest(file)
+            digest2 = hashlib.sha256(buf).hexdigest()
+            stage.size += file_size + len(buf)
+            if digest1!=digest2:
+                raise RuntimeError('Not same digest. ({}, {})'.format(digest1, digest2))
+            print('Same data! (sha256: {})'.format(digest1))
+            return
+
+        with open(file, 'rb') as f1:
+            compare_streams(f1, io.BytesIO(buf), stage)
+    print('Same data!')
@@ -1,36 +1,164 @@
-import os, argparse, shutil
-from io_util import mkdir, compare
-from texture_asset import TextureUasset, get_all_file_path
+import os, sys, time, glob, argparse, shutil, tempfile, threading, multiprocessing, functools
+from io_util import mkdir, compare, compare_with_buffer, check, stage_file
+from texture_asset import TextureUasset, get_all_file_path, scan_uexp_slowly
 from dds import DDS
-from file_list import get_file_list_from_folder, get_file_list_from_txt, get_file_list_rec
+from file_list import get_file_list_from_txt, get_base_folder, walk_folder, remove_quotes, UexpIndex
+from batch import run_parallel, print_summary, get_shared_executor, get_error_info
+from profiler import PROFILER
+#modules only for some modes (index, watch, serve, etc.) are imported when they are used.
+#(numpy is required only for exporting textures as images and generating mipmaps.)
 
-#get arguments
-def get_args():
+#get arguments (argv: arguments from a client in serve mode)
+def get_args(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('file', help='.uasset, .uexp, .ubulk, or a folder')
+    parser.add_argument('file', nargs='*', help='.uasset, .uexp, .ubulk, folders, or a texture index (.db). glob patterns can be used')
+    parser.add_argument('--from_stdin', '--from-stdin', action='store_true', help='read input paths from stdin (one path per line)')
     parser.add_argument('--save_folder', default='output', type=str, help='save folder')    
-    parser.add_argument('--mode', default='parse', type=str, help='valid, parse, copy_uasset, inject, or remove_mipmaps')    
-    args = parser.parse_args()
+    parser.add_argument('--mode', default='parse', type=str, help='valid, parse, copy_uasset, inject, watch, remove_mipmaps, export, index, clean, or serve')    
+    parser.add_argument('--as', dest='export_as', default='dds', choices=['dds', 'png', 'tga'], help='file format for export mode')
+    parser.add_argument('--generate_mips', '--generate-mips', action='store_true',
+                        help='make a full mipmap chain from the largest mipmap in inject mode (requires numpy. '
+                             'BC7 and BC6H mipmaps are re-encoded with one mode (6 and 11), which can lower their quality)')
+    parser.add_argument('--mip_filter', '--mip-filter', default='box', choices=['box', 'kaiser'],
+                        help='filter for --generate_mips (kaiser is sharper)')
+    parser.add_argument('--hash', dest='use_hash', action='store_true', help='compare sha256 digests instead of bytes in valid mode')
+    parser.add_argument('--check_scan', '--check-scan', action='store_true',
+                        help='compare the uexp scan with the old byte-by-byte scanner in valid mode (slow)')
+    parser.add_argument('--in_memory', '--in-memory', action='store_true',
+                        help='rebuild assets in memory for valid mode (no temporary files, continue after failures)')
+    parser.add_argument('--mmap', action='store_true', help='map uexp and ubulk to memory instead of reading them')
+    parser.add_argument('--include', action='append', default=None, type=str,
+                        help='glob pattern for file names or paths relative to the folder in folder mode (e.g. "*/Textures/*"). can be used multiple times')
+    parser.add_argument('--exclude', action='append', default=None, type=str,
+                        help='glob pattern for files or folders to skip in folder mode (same as --include). can be used multiple times')
+    parser.add_argument('--workspace', default='workspace', type=str,
+                        help='folder to keep assets staged by copy_uasset for inject and watch mode '
+                             '("temp": a folder only for this run, removed after it)')
+    parser.add_argument('--force', action='store_true', help='rebuild all assets in a file list (.txt) even if they are up to date')
+    parser.add_argument('--header_cache_size', '--header-cache-size', default=HEADER_CACHE_SIZE, type=float,
+                        help='budget (MiB) for headers of assets kept for later injections. mipmap data are read from files and not counted '
+                             '(0: no cache. set by the server in serve mode)')
+    parser.add_argument('--delay', default=0.5, type=float, help='seconds to wait for a dds file to be fully written in watch mode')
+    parser.add_argument('--polling', action='store_true', help='check files at intervals instead of using inotify in watch mode')
+    parser.add_argument('--jobs', default=None, type=int,
+                        help='number of processes for folder mode or serve mode (0: all cores. default: 1, or all workers of the server for jobs sent to it)')
+    parser.add_argument('--profile', default=None, nargs='?', const='profile.json', type=str,
+                        help='measure time and bytes of each stage and save a report (.json or .csv)')
+    parser.add_argument('--index_file', default='texture_index.db', type=str, help='texture index for index mode')
+    parser.add_argument('--format', default=None, type=str, help='filter for texture index (e.g. BC7)')
+    parser.add_argument('--min_size', default=None, type=int, help='filter for texture index (max width or height)')
+    parser.add_argument('--has_ubulk', action='store_true', help='filter for texture index')
+    args = parser.parse_intermixed_args(argv)
+    if len(args.file)==0 and not args.from_stdin and args.mode not in ['serve', 'clean']:
+        parser.error('the following arguments are required: file')
     return args
 
+WORKSPACE = 'workspace'
+TEMP_WORKSPACE = 'temp'
+
+#folders in workspace
+def get_valid_folder(workspace):
+    return os.path.join(workspace, 'valid')
+
+def get_uasset_folder(workspace):
+    return os.path.join(workspace, 'uasset')
+
+#folder which has workspaces of runs ("temp" makes them in the default workspace)
+def get_workspace_root(workspace):
+    return WORKSPACE if workspace==TEMP_WORKSPACE else workspace
+
+#make a workspace only for this run
+def make_temp_workspace(workspace):
+    root = get_workspace_root(workspace)
+    mkdir(root)
+    return tempfile.mkdtemp(prefix='run_', dir=root)
+
+#remove a workspace made by make_temp_workspace (and its parent if it is empty)
+def remove_temp_workspace(temp_workspace):
+    reset_workspace_index(get_uasset_folder(temp_workspace))
+    shutil.rmtree(temp_workspace, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(temp_workspace))
+    except OSError:
+        pass
+
+#indexes of uexp files in uasset folders (built once and updated by copy_uasset)
+#(jobs of serve mode can use different workspaces at the same time)
+workspace_indexes = {}
+workspace_index_lock = threading.Lock()
+
+#parsed assets for inject mode (kept between jobs in serve mode and between changes in watch mode)
+#(the budget caps bytes of headers. it is set by the server for jobs sent to it)
+HEADER_CACHE_SIZE = 64 #MiB
+template_cache = None
+cache_budget = HEADER_CACHE_SIZE*1024*1024
+
+#(size: MiB)
+def set_cache_budget(size):
+    global cache_budget
+    cache_budget = int(size*1024*1024)
+    if template_cache is not None:
+        template_cache.set_budget(cache_budget)
+
+def get_template_cache():
+    global template_cache
+    if template_cache is None:
+        from template_cache import TemplateCache
+        template_cache = TemplateCache(cache_budget)
+    return template_cache
+
+#get the index of a uasset folder (rebuild: scan the folder again)
+def get_workspace_index(uasset_folder, rebuild=False):
+    key = os.path.abspath(uasset_folder)
+    with workspace_index_lock:
+        index = workspace_indexes.get(key)
+    if index is None or rebuild:
+        index = UexpIndex(uasset_folder)
+        with workspace_index_lock:
+            workspace_indexes[key] = index
+    return index
+
+#remove the index of a uasset folder (it will be built again when it is needed)
+def reset_workspace_index(uasset_folder):
+    with workspace_index_lock:
+        return workspace_indexes.pop(os.path.abspath(uasset_folder), None)
+
+#find the staged asset for dds
+#(the index is built again only when it can be old. assets can be staged or removed while watching.)
+def find_staged_asset(uasset_folder, dds_file):
+    name = os.path.splitext(os.path.basename(dds_file))[0]
+    try:
+        uexp_file = get_workspace_index(uasset_folder).find(dds_file)
+        found = os.path.splitext(os.path.basename(uexp_file))[0]
+        if found==name and os.path.exists(os.path.join(uasset_folder, uexp_file)):
+            return uexp_file
+    except RuntimeError:
+        pass
+    return get_workspace_index(uasset_folder, rebuild=True).find(dds_file)
+
 #parse dds or uasset
 def parse(folder, file, save_folder, clear=True):
     file = os.path.join(folder, file)
     if file[-3:] in ['dds', 'DDS']:
-        DDS.load(file, verbose=True)
+        DDS.load(file, verbose=True, lazy=True)
     else:
-        TextureUasset(file, verbose=True)
+        TextureUasset(file, verbose=True, lazy=True)
+
+#make or clear workspace
+def make_workspace(folder, clear=True):
+    if clear and os.path.exists(folder):
+        shutil.rmtree(folder)
+        print('clear: {}'.format(folder))
+    mkdir(folder)
 
 #check if the tool can read and write a file correctly.
-def valid(folder, file, save_folder, clear=True):
+#(check_scan: compare the uexp scan with the old byte-by-byte scanner)
+def valid(folder, file, save_folder, clear=True, use_mmap=False, use_hash=False, in_memory=False, workspace=WORKSPACE, check_scan=False):
 
     #make or clear workspace
-    save_folder = 'workspace/valid'
-    if clear and os.path.exists(save_folder):
-        shutil.rmtree(save_folder)
-        print('clear: {}'.format(save_folder))
-    mkdir(save_folder)
-    print('clear: {}'.format(save_folder))
+    save_folder = get_valid_folder(workspace)
+    if not in_memory:
+        make_workspace(save_folder, clear=clear)
 
     src_file = os.path.join(folder, file)
     new_file=os.path.join(save_folder, file)
@@ -38,38 +166,57 @@ def valid(folder, file, save_folder, clear=True):
     if file[-3:] in ['dds', 'DDS']:
         #read and write dds
         dds = DDS.load(src_file)
+        if in_memory:
+            compare_with_buffer(src_file, dds.to_bytes(), use_hash=use_hash)
+            return
         dds.save(new_file)
 
         #compare and remove files
-        compare(src_file, new_file)
+        compare(src_file, new_file, use_hash=use_hash)
         os.remove(new_file)
 
     else:
         #read and write uasset
         uasset_name, uexp_name, ubulk_name = get_all_file_path(src_file)
-        texture = TextureUasset(file, verbose=True)
+        texture = TextureUasset(src_file, verbose=True, use_mmap=use_mmap)
+
+        if check_scan:
+            head_end = len(texture.head)
+            unk_end = head_end + 24 + len(texture.unk) - 4
+            check(scan_uexp_slowly(uexp_name), (head_end, unk_end), msg='Uexp scan result mismatch.')
+            print('Scan results matched.')
+
+        if in_memory:
+            uasset, uexp, ubulk = texture.to_bytes()
+            texture.close()
+            compare_with_buffer(uasset_name, uasset, use_hash=use_hash)
+            compare_with_buffer(uexp_name, uexp, use_hash=use_hash)
+            if ubulk is not None:
+                compare_with_buffer(ubulk_name, ubulk, use_hash=use_hash)
+            return
+
         new_uasset_name, new_uexp_name, new_ubulk_name = texture.save(new_file)
+        texture.close()
 
         #compare and remove files
-        compare(uasset_name, new_uasset_name)
-        compare(uexp_name, new_uexp_name)
+        compare(uasset_name, new_uasset_name, use_hash=use_hash)
+        compare(uexp_name, new_uexp_name, use_hash=use_hash)
         os.remove(new_uasset_name)
         os.remove(new_uexp_name)
         if new_ubulk_name is not None:
-            compare(ubulk_name, new_ubulk_name)
+            compare(ubulk_name, new_ubulk_name, use_hash=use_hash)
             os.remove(new_ubulk_name)
 
 #copy uasset to workspace
-def copy_uasset(folder, file, save_folder, clear=True):
+def copy_uasset(folder, file, save_folder, clear=True, workspace=WORKSPACE):
     src_file = os.path.join(folder, file)
     TextureUasset(src_file) #check if the asset can parse
 
     #make or clear workspace
-    save_folder = 'workspace/uasset'
-    if clear and os.path.exists(save_folder):
-        shutil.rmtree(save_folder)
-        print('clear: {}'.format(save_folder))
-    mkdir(save_folder)
+    save_folder = get_uasset_folder(workspace)
+    make_workspace(save_folder, clear=clear)
+    if clear:
+        reset_workspace_index(save_folder)
 
     #copy files
     uasset_name, uexp_name, ubulk_name = get_all_file_path(src_file)
@@ -79,71 +226,120 @@ def copy_uasset(folder, file, save_folder, clear=True):
     folder = os.path.dirname(new_file)
     if folder not in ['.', ''] and not os.path.exists(folder):
         mkdir(folder)
-    shutil.copy(uasset_name, new_uasset_name)
-    shutil.copy(uexp_name, new_uexp_name)
-    print('copy: {} -> {}'.format(uasset_name, new_uasset_name))
-    print('copy: {} -> {}'.format(uexp_name, new_uexp_name))
-    if os.path.exists(ubulk_name):
-        shutil.copy(ubulk_name, new_ubulk_name)
-        print('copy: {} -> {}'.format(ubulk_name, new_ubulk_name))
+    #reflink, hardlink or symlink the files (the tool never writes into staged files.)
+    for src, dst in [[uasset_name, new_uasset_name], [uexp_name, new_uexp_name], [ubulk_name, new_ubulk_name]]:
+        if not os.path.exists(src):
+            continue
+        method = stage_file(src, dst)
+        print('{}: {} -> {}'.format(method, src, dst))
+    with workspace_index_lock:
+        index = workspace_indexes.get(os.path.abspath(save_folder))
+        if index is not None:
+            index.add(os.path.relpath(new_uexp_name, save_folder))
 
 #inject dds into the asset copied to workspace
-def inject_dds(folder, file, save_folder, clear=True):
-    uasset_folder = 'workspace/uasset'
+def inject_dds(folder, file, save_folder, clear=True, generate_mips=False, mip_filter='box', workspace=WORKSPACE):
+    uasset_folder = get_uasset_folder(workspace)
     if not os.path.exists(uasset_folder):
-        raise RuntimeError('Uasset Not Found.')
+        raise RuntimeError('Uasset Not Found. (Run copy_uasset and inject with the same --workspace.)')
 
     #determine which file should be injected
-    file_list = get_file_list_rec(uasset_folder)
-    uexp_list=[]
-    for f in file_list:
-        if f[-4:]=='uexp':
-            uexp_list.append(f)
-    if len(uexp_list)==0:
-        raise RuntimeError('Uasset Not Found.')
-    elif len(uexp_list)==1:
-        uasset_base=uexp_list[0]
-    else:
-        dds_base = os.path.splitext(os.path.basename(file))[0]
-        uexp_base_list = [os.path.basename(file) for file in uexp_list]
-        if dds_base+'.uexp' not in uexp_base_list:
-            raise RuntimeError('The same name asset as dds not found. {}'.format(dds_base))
-        id = uexp_base_list.index(dds_base+'.uexp')
-        if id<0:
-            raise RuntimeError('Uasset Not Found ({})'.format(os.path.join(uasset_folder, dds_base+'.uexp')))
-        uasset_base=uexp_list[id]
-
-    #read uasset
+    uasset_base = find_staged_asset(uasset_folder, file)
+
+    #read uasset without mipmap data (the data will be replaced with dds)
+    #(it should be read if the asset will be overwritten.)
+    #(parsed assets are cached for injecting dds files into the same asset again.)
     uasset_file = os.path.join(uasset_folder, uasset_base)
-    texture = TextureUasset(uasset_file)
+    new_file = os.path.join(save_folder, uasset_base)
+    lazy = os.path.abspath(uasset_file)!=os.path.abspath(new_file)
+    if lazy:
+        texture = get_template_cache().get(uasset_file)
+    else:
+        texture = TextureUasset(uasset_file, lazy=lazy)
 
     #read and inject dds
+    #(lazy: mipmaps are streamed from dds to new files when saving.)
     src_file = os.path.join(folder, file)
-    new_file = os.path.join(save_folder, uasset_base)
-    dds = DDS.load(src_file)
-    texture.inject_dds(dds)
-    texture.save(new_file)
+    dds = DDS.load(src_file, lazy=True)
+    if generate_mips:
+        try:
+            from mipmap_generator import generate_mipmaps
+        except ImportError:
+            raise RuntimeError('numpy is required to generate mipmaps.')
+        with PROFILER.stage('generate mipmaps'):
+            generate_mipmaps(dds, mip_filter=mip_filter)
+    with PROFILER.stage('inject_dds') as stage:
+        texture.inject_dds(dds)
+        stage.size += sum([len(d) for d in dds.mipmap_data])
+    return texture.save(new_file)
+
+#inject dds files into staged assets whenever they are saved in a folder
+def watch_folder(args, inject_func, folder):
+    if not os.path.isdir(folder):
+        raise RuntimeError('Watch mode requires a folder.')
+    if args.workspace==TEMP_WORKSPACE:
+        raise RuntimeError('Watch mode can not use a temporary workspace. (Use the --workspace of copy_uasset mode.)')
+    uasset_folder = get_uasset_folder(args.workspace)
+    if not os.path.exists(uasset_folder):
+        raise RuntimeError('Uasset Not Found. (Run copy_uasset mode with the same --workspace first.)')
+    inject_func = functools.partial(inject_func, workspace=args.workspace)
+
+    def on_change(file):
+        start = time.perf_counter()
+        try:
+            with PROFILER.file(file):
+                inject_func(folder, file, args.save_folder)
+            print('done: {} ({:.0f} ms)'.format(file, (time.perf_counter()-start)*1000))
+        except Exception as e:
+            print('Error: {} ({})'.format(e, file))
 
-#export uasset as dds
-def export_as_dds(folder, file, save_folder, clear=True):
+    from watcher import watch
+    watch(folder, on_change, exts=['.dds'], delay=args.delay, use_polling=args.polling)
+
+#export uasset as dds (or png, tga)
+def export_as_dds(folder, file, save_folder, clear=True, use_mmap=False, export_as='dds'):
     src_file = os.path.join(folder, file)
     new_file = os.path.join(save_folder, file)
-    new_file=os.path.splitext(new_file)[0]+'.dds'
+    new_file=os.path.splitext(new_file)[0]+'.'+export_as
+
+    if export_as!='dds':
+        export_as_image(src_file, new_file)
+        return
 
-    texture = TextureUasset(src_file)
+    #mipmap data will be copied from the asset to dds without reading it (unless use_mmap)
+    texture = TextureUasset(src_file, use_mmap=use_mmap, lazy=not use_mmap)
     dds = DDS.asset_to_DDS(texture)
     dds.save(new_file)
+    del dds
+    texture.close()
+
+#decode the largest mipmap and save it as png or tga
+def export_as_image(src_file, new_file):
+    try:
+        from bc_decoder import decode_mipmap
+        from image_writer import save_image
+    except ImportError:
+        raise RuntimeError('numpy is required to export textures as images.')
+    texture = TextureUasset(src_file, lazy=True)
+    dds = DDS.asset_to_DDS(texture)
+    width, height = dds.mipmap_size[0]
+    rgba = decode_mipmap(dds.mipmap_data[0], width, height, dds.header.format_name)
+    save_image(new_file, rgba)
+    print('save: ' + new_file)
 
 #remove mipmaps from uasset
-def remove_mipmaps(folder, file, save_folder, clear=True):
+def remove_mipmaps(folder, file, save_folder, clear=True, use_mmap=False):
     src_file = os.path.join(folder, file)
     new_file = os.path.join(save_folder, file)
     print(save_folder)
     print(file)
     print(new_file)
-    texture = TextureUasset(src_file)
+    #copy the largest mipmap without reading it (unless use_mmap or the asset will be overwritten)
+    lazy = not use_mmap and os.path.abspath(src_file)!=os.path.abspath(new_file)
+    texture = TextureUasset(src_file, use_mmap=use_mmap, lazy=lazy)
     texture.remove_mipmaps()
     texture.save(new_file)
+    texture.close()
 
 mode_functions = {'valid': valid,
          'copy_uasset': copy_uasset,
@@ -153,45 +349,260 @@ mode_functions = {'valid': valid,
          'export': export_as_dds,
          }
 
-#main
-if __name__=='__main__':
-    args = get_args()
-    file = args.file
+#modes that can run in parallel with --jobs
+parallel_modes = ['valid', 'parse', 'export', 'remove_mipmaps']
+
+#modes that support --mmap
+mmap_modes = ['valid', 'export', 'remove_mipmaps']
+
+#modes that can query texture index
+index_modes = ['parse', 'export']
+
+#run a mode function for each file
+#(keep_going: continue after failures and print a summary)
+def run_batch(mode, func, folder, file_list, save_folder, jobs, keep_going=False, clear=True, workspace=WORKSPACE):
+    if mode=='inject':
+        #report name collisions before injecting anything
+        file_list = list(file_list)
+        get_workspace_index(get_uasset_folder(workspace)).check_collisions([f for f in file_list if f[-3:] in ['dds', 'DDS']])
+
+    if (jobs!=1 or get_shared_executor() is not None) and mode in parallel_modes:
+        file_list = list(file_list)
+        file_num = len(file_list)
+        errors = run_parallel(func, folder, file_list, save_folder, jobs, profile=PROFILER.enabled)
+    else:
+        #file_list can be a generator. (files are processed while walking folders.)
+        errors = {}
+        file_num = 0
+        for file in file_list:
+            file_num += 1
+            with PROFILER.file(file):
+                try:
+                    func(folder, file, save_folder, clear=clear)
+                except Exception as e:
+                    if not keep_going:
+                        raise
+                    print('Error: {} ({})'.format(e, file))
+                    errors[file] = get_error_info(e)
+            clear=False
+
+    if keep_going:
+        failed = print_summary(file_num, errors)
+    else:
+        failed = len(errors)
+    if failed>0:
+        raise RuntimeError('{} of {} files failed.'.format(failed, file_num))
+
+#query texture index and run a mode function for the results
+def run_index_query(mode, func, index_file, save_folder, args):
+    if mode not in index_modes:
+        raise RuntimeError('Texture index is only available in parse or export mode.')
+    from texture_index import TextureIndex, print_record
+    index = TextureIndex(index_file)
+    rows = index.query(format=args.format, min_size=args.min_size, has_ubulk=args.has_ubulk)
+    index.close()
+
+    if mode=='parse':
+        #print indexed metadata without parsing assets
+        for row in rows:
+            print_record(row)
+    else:
+        #group files by indexed folders
+        file_lists = {}
+        for row in rows:
+            directory, folder = get_base_folder(row['root'])
+            file_lists.setdefault(directory, []).append(os.path.join(folder, row['rel_path']))
+        for directory, file_list in file_lists.items():
+            run_batch(mode, func, directory, file_list, save_folder, args.jobs)
+    print('{} textures found.'.format(len(rows)))
+
+#remove staged assets and workspaces left by stopped runs
+def clean_workspace(workspace):
+    if not os.path.exists(workspace):
+        return
+    folders = [get_uasset_folder(workspace), get_valid_folder(workspace)]
+    folders += [os.path.join(workspace, f) for f in os.listdir(workspace) if f.startswith('run_')]
+    for folder in folders:
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+            print('clear: {}'.format(folder))
+
+#has wildcards of glob
+def has_magic(pattern):
+    return any([c in pattern for c in '*?['])
+
+#get input paths from arguments and stdin (glob patterns are expanded.)
+def get_input_paths(args):
+    patterns = list(args.file)
+    if args.from_stdin:
+        lines = [l.strip() for l in sys.stdin]
+        patterns += [remove_quotes(l) for l in lines if l!='']
+    paths = []
+    for pattern in patterns:
+        if has_magic(pattern) and not os.path.exists(pattern):
+            matched = sorted(glob.glob(pattern, recursive=True))
+            if len(matched)>0:
+                paths += matched
+                continue
+        paths.append(pattern)
+    if len(paths)==0:
+        raise RuntimeError('No input files.')
+    return paths
+
+#run a mode function for an input path (a file, folder, txt or texture index)
+#(workspace: workspace of this run for copy_uasset and inject)
+def run_path(args, func, inject_func, keep_going, file, clear=True, workspace=WORKSPACE):
+    mode = args.mode
     save_folder = args.save_folder
+    if not os.path.exists(file):
+        raise RuntimeError('File not found.')
+
+    if mode=='index':
+        #make or update texture index
+        from texture_index import TextureIndex
+        index = TextureIndex(args.index_file)
+        index.update(file)
+        index.close()
+
+    elif os.path.isfile(file) and file[-3:]=='.db':
+        #if input is texture index
+        run_index_query(mode, func, file, save_folder, args)
+
+    elif os.path.isfile(file) and file[-3:]!='txt':
+        #if input is a file
+        folder = os.path.dirname(file)
+        file = os.path.basename(file)
+        with PROFILER.file(file):
+            func(folder, file, save_folder, clear=clear)
+
+    elif os.path.isfile(file):
+        #if input file is txt (file list)
+        #(copy_uasset and inject run in a workspace only for this run.)
+        #(pairs whose inputs and outputs are not changed since the last run are skipped.)
+        folder, file_list = get_file_list_from_txt(file)
+        workspace = make_temp_workspace(args.workspace)
+        copy_func = functools.partial(copy_uasset, workspace=workspace)
+        inject_func = functools.partial(inject_func, workspace=workspace)
+        from build_manifest import BuildManifest, MANIFEST_FILE
+        manifest = BuildManifest(os.path.join(save_folder, MANIFEST_FILE))
+        options = {'generate_mips': args.generate_mips, 'mip_filter': args.mip_filter}
+        pairs = list(zip(file_list[0::2], file_list[1::2]))
+        skipped = 0
+        try:
+            for uasset_file, dds_file in pairs:
+                inputs = get_all_file_path(os.path.join(folder, uasset_file)) + [os.path.join(folder, dds_file)]
+                key = os.path.abspath(inputs[1])
+                if not args.force and manifest.is_up_to_date(key, inputs, options):
+                    print('up to date: {}'.format(dds_file))
+                    skipped += 1
+                    continue
+                manifest.remove(key)
+                with PROFILER.file(uasset_file):
+                    copy_func(folder, uasset_file, save_folder)
+                with PROFILER.file(dds_file):
+                    outputs = inject_func(folder, dds_file, save_folder)
+                manifest.update(key, inputs, [o for o in outputs if o is not None], options)
+        finally:
+            manifest.save()
+            remove_temp_workspace(workspace)
+        print('{} of {} pairs are up to date.'.format(skipped, len(pairs)))
+
+    else:
+        #if input is a folder (including subfolders)
+        folder, file_list = walk_folder(file, exts=['.uexp', '.dds'], include=args.include, exclude=args.exclude)
+        run_batch(mode, func, folder, file_list, save_folder, args.jobs, keep_going=keep_going, clear=clear, workspace=workspace)
+
+#run the tool with parsed arguments
+#(served: the job is sent to the server. it runs with jobs of other clients.)
+def run(args, served=False):
     mode = args.mode
+    #PROFILER has results for each thread
+    PROFILER.enabled = args.profile is not None
+    PROFILER.results = []
+    if args.jobs is None:
+        #jobs sent to the server use all workers of it by default
+        args.jobs = 0 if served else 1
+    if not served:
+        set_cache_budget(args.header_cache_size)
+    #workspace can be changed by other processes between jobs in serve mode
+    reset_workspace_index(get_uasset_folder(args.workspace))
+    temp_workspace = None
 
     try:
-        if mode not in mode_functions:
+        if mode=='clean':
+            clean_workspace(get_workspace_root(args.workspace))
+            print('Success!')
+            return
+        if mode=='watch':
+            paths = get_input_paths(args)
+            if len(paths)!=1:
+                raise RuntimeError('Watch mode requires a folder.')
+            watch_folder(args, functools.partial(inject_dds, generate_mips=args.generate_mips, mip_filter=args.mip_filter), paths[0])
+            return
+        if mode not in mode_functions and mode!='index':
             raise RuntimeError('Unsupported mode. {}'.format(mode))
-        func = mode_functions[mode]
-
-        if os.path.isfile(file) and file[-3:]!='txt':
-            #if input is a file
-            folder = os.path.dirname(file)
-            file = os.path.basename(file)
-            func(folder, file, save_folder)
+        func = mode_functions.get(mode)
+        if args.mmap and mode in mmap_modes:
+            func = functools.partial(func, use_mmap=True)
+        if mode=='export':
+            func = functools.partial(func, export_as=args.export_as)
+        if mode=='valid' and args.use_hash:
+            func = functools.partial(func, use_hash=True)
+        if mode=='valid' and args.check_scan:
+            func = functools.partial(func, check_scan=True)
+        keep_going = mode=='valid' and args.in_memory
+        if keep_going:
+            func = functools.partial(func, in_memory=True)
+        #copy_uasset and inject use a workspace only for this run with --workspace=temp.
+        #(valid mode always writes rebuilt files to a workspace only for this run.)
+        workspace = args.workspace
+        if (mode in ['copy_uasset', 'inject'] and workspace==TEMP_WORKSPACE) or (mode=='valid' and not args.in_memory):
+            temp_workspace = make_temp_workspace(args.workspace)
+            workspace = temp_workspace
+        if mode in ['copy_uasset', 'valid']:
+            func = functools.partial(func, workspace=workspace)
+        inject_func = functools.partial(inject_dds, generate_mips=args.generate_mips, mip_filter=args.mip_filter)
+        if mode=='inject':
+            func = functools.partial(inject_func, workspace=workspace)
 
+        paths = get_input_paths(args)
+        if len(paths)==1:
+            run_path(args, func, inject_func, keep_going, paths[0], workspace=workspace)
         else:
-            if os.path.isfile(file):
-                #if input file is txt (file list)
-                folder, file_list = get_file_list_from_txt(file)
-                func= [copy_uasset, inject_dds]
-                inject=0
-                for file in file_list:
-                    func[inject](folder, file, save_folder)
-                    inject = not inject
-            else:
-                #if input is a folder
-                folder = file
-                clear=True
-                folder, file_list = get_file_list_from_folder(file)
-                for file in file_list:
-                    if file[-4:]=='uexp' or file[-3:] in ['dds', 'DDS']:
-                        func(folder, file, save_folder, clear=clear)
-                        clear=False
+            #process all paths in this process and report them at once
+            errors = {}
+            for i, path in enumerate(paths):
+                try:
+                    run_path(args, func, inject_func, keep_going, path, clear=i==0, workspace=workspace)
+                except Exception as e:
+                    print('Error: {} ({})'.format(e, path))
+                    errors[path] = get_error_info(e)
+            failed = print_summary(len(paths), errors)
+            if failed>0:
+                raise RuntimeError('{} of {} inputs failed.'.format(failed, len(paths)))
 
     except Exception as e:
         print('Error: {}'.format(e))
         raise RuntimeError(e)
+    finally:
+        if temp_workspace is not None:
+            remove_temp_workspace(temp_workspace)
+        if PROFILER.enabled:
+            PROFILER.print()
+            PROFILER.save(args.profile)
     print('Success!')
 
+#main
+if __name__=='__main__':
+    multiprocessing.freeze_support()
+    if sys.argv[1:2]==['--client']:
+        #send the rest of arguments to the server (for the exe which has no client.py)
+        from client import run_client
+        sys.exit(run_client(sys.argv[2:]))
+    args = get_args()
+    if args.mode=='serve':
+        from server import serve
+        set_cache_budget(args.header_cache_size)
+        serve(lambda argv: run(get_args(argv), served=True), jobs=args.jobs or 0)
+    else:
+        run(args)
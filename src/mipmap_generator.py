@@ -0,0 +1,112 @@
+import numpy as np
+from bc_decoder import decode_mipmap, decode_hdr_mipmap, HDR_BLOCK_DECODERS
+from bc_encoder import encode_mipmap
+from dds import get_mipmap_sizes
+
+'''
+Mipmap generator
+
+makes a full mipmap chain from the largest mipmap with a box filter or a Kaiser filter.
+B8G8R8A8(sRGB) is filtered in linear space.
+Block compressed formats are decoded, filtered, and re-encoded.
+(The encoder uses one mode for BC7 and BC6H. see bc_encoder.py)
+'''
+
+FILTERS = ['box', 'kaiser']
+
+#Kaiser windowed sinc (taps on each side and the shape of the window)
+KAISER_WIDTH = 3
+KAISER_ALPHA = 4
+
+def srgb_to_linear(x):
+    return np.where(x<=0.04045, x/12.92, ((x+0.055)/1.055)**2.4)
+
+def linear_to_srgb(x):
+    x = np.clip(x, 0, 1)
+    return np.where(x<=0.0031308, x*12.92, 1.055*x**(1/2.4)-0.055)
+
+#2x2 box filter (odd rows and columns at the end are ignored)
+def downsample(image):
+    for axis in [0, 1]:
+        size = image.shape[axis]
+        if size==1:
+            continue
+        size = size//2*2
+        even = image.take(np.arange(0, size, 2), axis=axis)
+        odd = image.take(np.arange(1, size, 2), axis=axis)
+        image = (even+odd)*0.5
+    return image
+
+#weights for pixels at -2.5, -1.5, ..., 2.5 from the center of an output pixel
+def kaiser_weights():
+    x = np.arange(-KAISER_WIDTH, KAISER_WIDTH) + 0.5
+    window = np.i0(KAISER_ALPHA*np.sqrt(1-(x/KAISER_WIDTH)**2))/np.i0(KAISER_ALPHA)
+    weights = np.sinc(x/2)*window
+    return weights/weights.sum()
+
+#downsample with a Kaiser filter (sharper than box. pixels at the edges are repeated.)
+def kaiser_downsample(image):
+    weights = kaiser_weights()
+    for axis in [0, 1]:
+        size = image.shape[axis]
+        if size==1:
+            continue
+        left = np.arange(size//2)*2 - (KAISER_WIDTH-1)
+        filtered = 0
+        for i, weight in enumerate(weights):
+            filtered = filtered + image.take(np.clip(left+i, 0, size-1), axis=axis)*weight
+        image = filtered.astype(np.float32)
+    return image
+
+#decode the largest mipmap as float32 (height, width, C)
+def decode_image(data, width, height, format_name):
+    if format_name in HDR_BLOCK_DECODERS or format_name=='FloatRGBA':
+        image = decode_hdr_mipmap(data, width, height, format_name)
+    else:
+        image = decode_mipmap(data, width, height, format_name)
+    image = np.nan_to_num(image.astype(np.float32), nan=0, posinf=65504, neginf=-65504)
+    if format_name=='B8G8R8A8(sRGB)':
+        image[:, :, :3] = srgb_to_linear(image[:, :, :3]/255)
+    return image
+
+#filtered image to the value range of the format
+def encode_image(image, width, height, format_name):
+    if format_name=='B8G8R8A8(sRGB)':
+        image = image.copy()
+        image[:, :, :3] = linear_to_srgb(image[:, :, :3])*255
+    return encode_mipmap(image, width, height, format_name)
+
+#replace mipmaps of dds with a full mipmap chain made from the largest one
+#(mip_filter: 'box' or 'kaiser')
+def generate_mipmaps(dds, mip_filter='box'):
+    header = dds.header
+    format_name = header.format_name
+    if format_name=='BC6H(signed)':
+        raise RuntimeError('Mipmap generation is not supported for BC6H(signed).')
+    if header.mipmap_num>1:
+        print('dds already has mipmaps. ({})'.format(header.mipmap_num))
+        return
+
+    width, height = dds.mipmap_size[0]
+    image = decode_image(dds.mipmap_data[0], width, height, format_name)
+    image = image[:header.height, :header.width]
+    if mip_filter not in FILTERS:
+        raise RuntimeError('Unknown filter. ({})'.format(mip_filter))
+    #negative lobes of Kaiser can make values out of the range of the largest mipmap
+    low = image.min(axis=(0, 1))
+    high = image.max(axis=(0, 1))
+
+    mipmap_num = max(header.width, header.height).bit_length()
+    mipmap_size = get_mipmap_sizes(header.width, header.height, mipmap_num)
+    mipmap_data = [dds.mipmap_data[0]]
+    for width, height in mipmap_size[1:]:
+        if mip_filter=='kaiser':
+            image = np.clip(kaiser_downsample(image), low, high)
+        else:
+            image = downsample(image)
+        mipmap_data.append(encode_image(image, width, height, format_name))
+
+    dds.mipmap_data = mipmap_data
+    dds.mipmap_size = mipmap_size
+    header.mipmap_num = mipmap_num
+    print('mipmaps have been generated. (1 -> {})'.format(mipmap_num))
@@ -0,0 +1,102 @@
+import os, time, json, csv, threading, contextlib
+
+'''
+Per-stage timer for --profile
+
+usage: with PROFILER.stage('uexp read') as s:
+           buf = f.read()
+           s.size += len(buf)
+'''
+
+class Stage:
+    def __init__(self, name, size=0):
+        self.name = name
+        self.size = size
+
+#(each thread has its own results. jobs of serve mode run in threads.)
+class Profiler(threading.local):
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}  #stage name: [seconds, bytes, count]
+        self.results = [] #[(file, stages), ...]
+
+    #measure a stage (bytes can be added to the yielded Stage)
+    @contextlib.contextmanager
+    def stage(self, name, size=0):
+        stage = Stage(name, size)
+        if not self.enabled:
+            yield stage
+            return
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            record = self.stages.setdefault(name, [0, 0, 0])
+            record[0] += time.perf_counter()-start
+            record[1] += stage.size
+            record[2] += 1
+
+    #collect stages for a file
+    @contextlib.contextmanager
+    def file(self, file):
+        self.stages = {}
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.results.append((file, self.stages))
+            self.stages = {}
+
+    #get results and clear them (to send them from worker processes)
+    def pop_results(self):
+        results = self.results
+        self.results = []
+        return results
+
+    def get_total(self):
+        total = {}
+        for file, stages in self.results:
+            for name, record in stages.items():
+                t = total.setdefault(name, [0, 0, 0])
+                for i in range(3):
+                    t[i] += record[i]
+        return total
+
+    def to_rows(self):
+        rows = []
+        for file, stages in self.results + [('(total)', self.get_total())]:
+            for name, (seconds, size, count) in stages.items():
+                mbps = size/seconds/1024**2 if seconds>0 else 0
+                rows.append({'file': file, 'stage': name, 'count': count,
+                             'seconds': seconds, 'bytes': size, 'MB/s': mbps})
+        return rows
+
+    def print(self):
+        print('Profile (total of {} files)'.format(len(self.results)))
+        for row in self.to_rows():
+            if row['file']!='(total)':
+                continue
+            if row['bytes']>0:
+                print('  {}: {:.3f} sec, {} bytes, {:.1f} MB/s ({} times)'.format(
+                    row['stage'], row['seconds'], row['bytes'], row['MB/s'], row['count']))
+            else:
+                print('  {}: {:.3f} sec ({} times)'.format(row['stage'], row['seconds'], row['count']))
+
+    #save as json or csv (by extension)
+    def save(self, file):
+        rows = self.to_rows()
+        if os.path.splitext(file)[1].lower()=='.csv':
+            with open(file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['file', 'stage', 'count', 'seconds', 'bytes', 'MB/s'])
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            report = {'files': {}, 'total': {}}
+            for row in rows:
+                stages = report['total'] if row['file']=='(total)' else report['files'].setdefault(row['file'], {})
+                stages[row['stage']] = {k: row[k] for k in ['count', 'seconds', 'bytes', 'MB/s']}
+            with open(file, 'w') as f:
+                json.dump(report, f, indent=2)
+        print('save: ' + file)
+
+PROFILER = Profiler()
@@ -0,0 +1,209 @@
+import os, io, sys, json, secrets, threading, contextlib
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from concurrent.futures import ProcessPoolExecutor
+from batch import set_shared_executor
+
+'''
+Job server for serve mode
+
+main.py --mode serve keeps one process (and a process pool) alive.
+client.py (or main.py --client) sends command line arguments to it and prints the log.
+
+Each client is handled in its own thread. Folder modes send files to the shared pool.
+The server writes its port and a random key to SERVER_FILE, which is in a folder of the user.
+'''
+
+def get_server_file():
+    if os.name=='nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'FF7R-DDS-tools', 'server.json')
+
+SERVER_FILE = get_server_file()
+
+#seconds to wait for a job after a client connected
+RECV_TIMEOUT = 5
+
+#number of clients which can wait for the server to accept them
+BACKLOG = 16
+
+#send printed text to the client line by line
+class ConnectionWriter:
+    def __init__(self, conn):
+        self.conn = conn
+        self.buf = ''
+        self.closed = False
+
+    def write(self, s):
+        self.buf += s
+        if '\n' in self.buf:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if self.buf=='' or self.closed:
+            return
+        try:
+            self.conn.send(('log', self.buf))
+        except OSError:
+            #the client has gone. the job will be finished anyway.
+            self.closed = True
+        self.buf = ''
+
+#sys.stdout, sys.stderr or sys.stdin which can be replaced for each thread
+#(jobs print to their own clients.)
+class ThreadStream:
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def get(self):
+        return getattr(self.local, 'stream', self.default)
+
+    def set(self, stream):
+        self.local.stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __iter__(self):
+        return iter(self.get())
+
+#the working directory is shared by threads.
+#jobs from the same folder run at the same time, and jobs from other folders wait for them.
+class FolderLock:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.count = 0
+
+    @contextlib.contextmanager
+    def enter(self, folder):
+        with self.cond:
+            while self.count>0 and os.getcwd()!=folder:
+                self.cond.wait()
+            if os.getcwd()!=folder:
+                os.chdir(folder)
+            self.count += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.count -= 1
+                if self.count==0:
+                    self.cond.notify_all()
+
+#run a job from a client and send the log and the result
+def handle_job(conn, run_argv, job, folder_lock):
+    writer = ConnectionWriter(conn)
+    error = None
+    #paths for --from-stdin are sent by the client
+    streams = [(sys.stdout, writer), (sys.stderr, writer), (sys.stdin, io.StringIO(job.get('stdin', '')))]
+    for stream, value in streams:
+        stream.set(value)
+    try:
+        with folder_lock.enter(job['cwd']):
+            run_argv(job['argv'])
+    except SystemExit:
+        #argparse printed the usage
+        error = 'Invalid arguments.'
+    except Exception as e:
+        error = str(e)
+    finally:
+        for stream, value in streams:
+            stream.set(stream.default)
+    writer.flush()
+    if not writer.closed:
+        try:
+            conn.send(('done', error))
+        except OSError:
+            pass
+    conn.close()
+    print('job {}: {}'.format(' '.join(job['argv']), 'failed' if error else 'done'))
+
+#write port and key for clients (only the user can read it)
+def write_server_file(port, authkey):
+    folder = os.path.dirname(SERVER_FILE)
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    fd = os.open(SERVER_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'port': port, 'authkey': authkey.hex()}, f)
+
+#accept jobs until a client sends stop (run_argv: function to run the tool with command line arguments)
+def serve(run_argv, jobs=0):
+    if jobs<=0:
+        jobs = os.cpu_count()
+    authkey = secrets.token_bytes(32)
+    folder_lock = FolderLock()
+    threads = []
+    stdout, stderr, stdin = sys.stdout, sys.stderr, sys.stdin
+    sys.stdout, sys.stderr, sys.stdin = ThreadStream(stdout), ThreadStream(stderr), ThreadStream(stdin)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        set_shared_executor(executor, jobs)
+        listener = Listener(('localhost', 0), backlog=BACKLOG, authkey=authkey)
+        write_server_file(listener.address[1], authkey)
+        print('serving on {}:{} with {} workers. (Ctrl+C or "client.py --stop" to stop)'.format(*listener.address, jobs))
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    print('Rejected a connection. ({})'.format(e))
+                    continue
+                try:
+                    if not conn.poll(RECV_TIMEOUT):
+                        raise EOFError('No job was sent.')
+                    job = conn.recv()
+                except (EOFError, OSError) as e:
+                    print('Lost a client. ({})'.format(e))
+                    conn.close()
+                    continue
+                if job.get('stop'):
+                    #finish running jobs before stopping
+                    threads = [t for t in threads if t.is_alive()]
+                    if len(threads)>0:
+                        print('waiting for {} jobs...'.format(len(threads)))
+                    for thread in threads:
+                        thread.join()
+                    conn.send(('done', None))
+                    conn.close()
+                    break
+                thread = threading.Thread(target=handle_job, args=(conn, run_argv, job, folder_lock), daemon=True)
+                thread.start()
+                threads = [t for t in threads if t.is_alive()] + [thread]
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            set_shared_executor(None)
+            sys.stdout, sys.stderr, sys.stdin = stdout, stderr, stdin
+            if os.path.exists(SERVER_FILE):
+                os.remove(SERVER_FILE)
+    print('server stopped.')
+
+#send a job to the server and print its log. returns an error message or None
+def submit(argv, stop=False):
+    if not os.path.exists(SERVER_FILE):
+        raise RuntimeError('Server not found. (Run "main.py --mode serve".)')
+    with open(SERVER_FILE, 'r') as f:
+        info = json.load(f)
+    try:
+        conn = Client(('localhost', info['port']), authkey=bytes.fromhex(info['authkey']))
+    except ConnectionRefusedError:
+        raise RuntimeError('Server not found. ({} is left by a stopped server.)'.format(SERVER_FILE))
+    with conn:
+        if stop:
+            conn.send({'stop': True})
+        else:
+            job = {'argv': argv, 'cwd': os.getcwd()}
+            if '--from_stdin' in argv or '--from-stdin' in argv:
+                job['stdin'] = sys.stdin.read()
+            conn.send(job)
+        while True:
+            kind, value = conn.recv()
+            if kind=='log':
+                sys.stdout.write(value)
+                sys.stdout.flush()
+            else:
+                return value
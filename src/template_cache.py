@@ -0,0 +1,91 @@
+import os, threading
+from collections import OrderedDict
+from io_util import FileRange
+from texture_asset import TextureUasset, get_all_file_path
+
+'''
+Cache of parsed texture assets for inject mode
+
+Assets are parsed without mipmap data (lazy mode) and kept as templates.
+get() returns a clone of a template, which shares unchanged data with it.
+
+A template is parsed again when the size, mtime or inode of its files are changed.
+(staged files can be replaced with links to other assets.)
+The least recently used templates are removed when the total size exceeds the budget.
+(templates refer to mipmap data in files. only headers are counted for the budget.)
+'''
+
+#get (size, mtime, inode) of uasset, uexp and ubulk
+def get_stats(uasset_file):
+    stats = []
+    for file in get_all_file_path(uasset_file):
+        try:
+            st = os.stat(file)
+        except FileNotFoundError:
+            stats.append(None)
+            continue
+        stats.append((st.st_size, st.st_mtime_ns, st.st_ino))
+    return stats
+
+#get bytes of headers kept in a parsed asset (ranges of mipmap data in files are not counted)
+def get_template_size(texture):
+    size = texture.uasset.size + len(texture.head) + len(texture.unk)
+    data = list(texture.uexp_map_data)
+    if texture.has_ubulk:
+        data += texture.ubulk_map_data
+    for d in data:
+        if not isinstance(d, FileRange):
+            size += len(d)
+    return size
+
+class TemplateCache:
+    def __init__(self, budget):
+        self.budget = budget #bytes (0: disable cache)
+        self.templates = OrderedDict() #absolute path: (stats, texture, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() #jobs of serve mode share the cache
+
+    #get a copy of a parsed asset
+    def get(self, uasset_file):
+        key = os.path.abspath(uasset_file)
+        stats = get_stats(uasset_file)
+        with self.lock:
+            entry = self.templates.get(key)
+            if entry is not None and entry[0]==stats:
+                self.templates.move_to_end(key)
+                self.hits += 1
+                return entry[1].clone()
+            self.misses += 1
+
+        texture = TextureUasset(uasset_file, lazy=True)
+        size = get_template_size(texture)
+        with self.lock:
+            self.discard(key)
+            if size<=self.budget:
+                self.templates[key] = (stats, texture, size)
+                self.size += size
+                self.evict()
+        return texture.clone()
+
+    #change the budget and remove the least recently used templates
+    def set_budget(self, budget):
+        with self.lock:
+            self.budget = budget
+            self.evict()
+
+    def evict(self):
+        while self.size>self.budget:
+            key, (stats, texture, size) = self.templates.popitem(last=False)
+            self.size -= size
+
+    def discard(self, key):
+        entry = self.templates.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
+            self.size = 0
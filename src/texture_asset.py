@@ -1,6 +1,7 @@
-import os
+import os, io, mmap, struct, re, copy
 from io_util import *
 from uasset import Uasset
+from profiler import PROFILER
 
 BYTE_PER_PIXEL = {
     'DXT1/BC1': 0.5,
@@ -41,9 +42,72 @@ def get_all_file_path(file):
 
     return [base_name + ext for ext in EXT]
 
+UEXP_HEAD_END = re.compile(b'[\x03\x05]')
+UEXP_UNK_END = b'\x00\x00\x00\x00\x01'
+SCAN_SIZE = 0x10000
+
+#get the size of uexp head. (it ends with the first byte at an odd offset which is 3 or 5.)
+#(offset: even offset to start searching)
+def find_head_end(buf, offset=0):
+    for start in range(offset, len(buf), SCAN_SIZE):
+        odd_bytes = bytes(buf[start+1:start+SCAN_SIZE:2])
+        match = UEXP_HEAD_END.search(odd_bytes)
+        if match is not None:
+            return start + match.start()*2 + 2
+    raise RuntimeError('Failed to parse uexp. (The end of the head was not found.)')
+
+#get the offset of \x00\x00\x00\x00\x01 after the unknown data
+def find_unk_end(buf, start):
+    for pos in range(start, len(buf), SCAN_SIZE):
+        chunk = bytes(buf[pos:pos+SCAN_SIZE+len(UEXP_UNK_END)-1])
+        i = chunk.find(UEXP_UNK_END)
+        if i>=0:
+            return pos+i
+    raise RuntimeError('Failed to parse uexp. (The end of the unknown data was not found.)')
+
+#read uexp until a little after the unknown data (lazy mode does not read mipmap data)
+#(only new bytes are searched for each chunk)
+def read_uexp_head(f):
+    buf = bytearray()
+    head_end = None
+    unk_end = None
+    while True:
+        scanned = len(buf)
+        chunk = f.read(SCAN_SIZE)
+        buf += chunk
+        try:
+            if head_end is None:
+                head_end = find_head_end(buf, scanned)
+                scanned = head_end+24
+            if unk_end is None:
+                unk_end = find_unk_end(buf, max(head_end+24, scanned-len(UEXP_UNK_END)+1))
+        except RuntimeError:
+            pass
+        if len(chunk)<SCAN_SIZE or (unk_end is not None and unk_end+1024<=len(buf)):
+            return bytes(buf)
+
+#byte-by-byte scanner of old versions. (valid mode uses it to check find_head_end and find_unk_end.)
+def scan_uexp_slowly(uexp_name):
+    with open(uexp_name, 'rb') as f:
+        f.read(1)
+        b = f.read(1)
+        while (b not in [b'\x03', b'\x05']):
+            f.read(1)
+            b = f.read(1)
+        head_end = f.tell()
+
+        f.seek(24, 1)
+        b = f.read(5)
+        while (b!=UEXP_UNK_END):
+            b=b''.join([b[1:], f.read(1)])
+        unk_end = f.tell()-5
+    return head_end, unk_end
+
 #mipmap meta data (size, offset , etc.)
-class MipmapMetadata:
+class MipmapMetadata: #32 bytes
     UEXP_FLAG=[66817, 32]
+    LAYOUT = struct.Struct('<8I')
+
     def __init__(self, data_size, offset, size, uexp):
         self.uexp=uexp
         if uexp:
@@ -55,20 +119,22 @@ class MipmapMetadata:
         self.height=size[1]
         self.pixel_num = self.width*self.height
 
-    def read(f):
-        read_const_uint32(f, 1)    #Entry Indicator?
-        flag = read_uint32(f)      #uexp flag (32:uexp, 66817:ubulk)
-        uexp=flag==MipmapMetadata.UEXP_FLAG[1]
-        data_size = read_uint32(f)
+    def from_values(values, f=None):
+        one, flag, data_size, data_size2, offset, null, width, height = values
+        check(one, 1, f)                 #Entry Indicator?
+        uexp=flag==MipmapMetadata.UEXP_FLAG[1] #uexp flag (32:uexp, 66817:ubulk)
         if uexp:
-            check(data_size, 0)
-        read_const_uint32(f, data_size)
-        offset = read_uint32(f)
-        read_null(f)
-        width = read_uint32(f)
-        height = read_uint32(f)
+            check(data_size, 0, f)
+        check(data_size2, data_size, f)
+        check(null, 0, f, 'Not NULL!')
         return MipmapMetadata(data_size, offset, [width, height], uexp)
 
+    def read(f):
+        return MipmapMetadata.from_values(f.unpack(MipmapMetadata.LAYOUT), f)
+
+    def read_array(f, len):
+        return [MipmapMetadata.from_values(values, f) for values in f.unpack_array(MipmapMetadata.LAYOUT, len)]
+
     def print(self, padding=2):
         pad = ' '*padding
         print(pad + 'file: ' + 'uexp'*self.uexp + 'ubluk'*(not self.uexp))
@@ -82,125 +148,168 @@ class MipmapMetadata:
         self.data_size=0
         self.uexp=True
 
-    def write(self, f, uasset_size):
-        new_offset = f.tell() + uasset_size+24
-
-        write_uint32(f, 1)
-        write_uint32(f, MipmapMetadata.UEXP_FLAG[self.uexp])
-        write_uint32(f, self.data_size)
-        write_uint32(f, self.data_size)
+    #(start: position of uexp in the stream)
+    def write(self, f, uasset_size, start=0):
         if self.uexp:
-            write_uint32(f, new_offset)
+            offset = f.tell()-start + uasset_size+24
         else:
-            write_uint32(f, self.offset)
-        write_null(f)
-
-        write_uint32(f, self.width)
-        write_uint32(f, self.height)
+            offset = self.offset
+        f.pack(MipmapMetadata.LAYOUT, 1, MipmapMetadata.UEXP_FLAG[self.uexp], self.data_size, self.data_size,
+               offset, 0, self.width, self.height)
 
 class TextureUasset:
     UNREAL_SIGNATURE = b'\xC1\x83\x2A\x9E'
     UBULK_FLAG = [0, 16384]
+    SIZE_LAYOUT = struct.Struct('<II16s')      #original width, height, id
+    TEXTURE_LAYOUT = struct.Struct('<4HIIIIIHH') #[1,1,1,0], type name id, null, end offset, max size, 1, ubulk flag
+    MAP_DATA_LAYOUT = struct.Struct('<6I')     #1, 64, map data size x2, offset, null
     
-    def __init__(self, file_path, verbose=False):
-
-        if not os.path.isfile(file_path):
+    #data: (uasset, uexp, ubulk) buffers to read instead of files. (see from_bytes)
+    def __init__(self, file_path, verbose=False, use_mmap=False, lazy=False, data=None):
+
+        if data is not None:
+            #mipmap data will be memoryview slices of the buffers
+            lazy = False
+            use_mmap = False
+            uasset_data, uexp_data, ubulk_data = data
+        elif not os.path.isfile(file_path):
             raise RuntimeError('Not File. ({})'.format(file_path))
 
-        uasset_name, uexp_name, ubulk_name = get_all_file_path(file_path)
+        if file_path is None:
+            uasset_name, uexp_name, ubulk_name = None, None, None
+        else:
+            uasset_name, uexp_name, ubulk_name = get_all_file_path(file_path)
+
+        #memory-mapped files (mipmap data will be memoryview slices of them)
+        self.mmaps = []
+        #files that mipmap data still refers to
+        self.source_files = []
 
-        self.uasset = Uasset(uasset_name)
+        if data is None:
+            self.uasset = Uasset(uasset_name)
+        else:
+            self.uasset = Uasset(uasset_name, buf=uasset_data)
         if len(self.uasset.exports)!=1:
             raise RuntimeError('Unexpected number of exports')
+        self.uasset_size = self.uasset.size
 
-        with open(uasset_name, 'rb') as f:
-            self.uasset_size = get_size(f)
-
-        with open(uexp_name, 'rb') as f:
-
-            f.read(1)
-            b = f.read(1)
-            while (b not in [b'\x03', b'\x05']):
-                f.read(1)
-                b = f.read(1)
-
-            s = f.tell()
-            f.seek(0)
+        if data is not None:
+            buf = memoryview(uexp_data)
+        else:
+            with PROFILER.stage('uexp read') as stage, open(uexp_name, 'rb') as f:
+                if lazy:
+                    buf = read_uexp_head(f)
+                elif use_mmap:
+                    buf = self.map_file(f)
+                else:
+                    buf = f.read()
+                stage.size += len(buf)
+        f = BinaryReader(buf)
+
+        with PROFILER.stage('uexp scan') as stage:
+            s = find_head_end(buf)
             self.head=f.read(s)
-            self.original_width = read_uint32(f)
-            self.original_height = read_uint32(f)
-            self.id = f.read(16)
-            offset=f.tell()
-            b = f.read(5)
-            while (b!=b'\x00\x00\x00\x00\x01'):
-                b=b''.join([b[1:], f.read(1)])
-            s=f.tell()-offset-1
-            f.seek(offset)
-            self.unk = f.read(s)
-            unk = read_uint16_array(f, len=4)
-            check(unk, [1,1,1,0])
-            self.type_name_id = read_uint32(f)
-            read_null(f)
-            end_offset = read_uint32(f) #Offset to end of uexp?
-            self.max_width = read_uint32(f)
-            self.max_height = read_uint32(f)
-            one = read_uint16(f)
-            check(one, 1)
-            ubulk_flag = read_uint16(f) #ubulk flag (uexp:0, ubulk:16384)
-            self.has_ubulk=ubulk_flag==TextureUasset.UBULK_FLAG[1]
-            
-            self.type = read_str(f)
-            #check(self.type, name_list[self.type_name_id])
+            self.original_width, self.original_height, self.id = f.unpack(TextureUasset.SIZE_LAYOUT)
+            s = find_unk_end(buf, f.tell())
+            self.unk = f.read(s+4-f.tell())
+            stage.size += f.tell()
+        (*unk, self.type_name_id, null, end_offset, self.max_width, self.max_height,
+         one, ubulk_flag) = f.unpack(TextureUasset.TEXTURE_LAYOUT)
+        check(unk, [1,1,1,0])
+        check(null, 0, f, 'Not NULL!')
+        #end_offset: Offset to end of uexp?
+        check(one, 1)
+        #ubulk flag (uexp:0, ubulk:16384)
+        self.has_ubulk=ubulk_flag==TextureUasset.UBULK_FLAG[1]
+        
+        self.type = f.read_str()
+        #check(self.type, name_list[self.type_name_id])
 
-            if self.has_ubulk:
-                read_null(f)
-                read_null(f)
-                self.ubulk_map_num = read_uint32(f) #bulk map num + unk_map_num
-            else:
-                self.ubulk_map_num = 0
+        if self.has_ubulk:
+            f.read_null_array(2)
+            self.ubulk_map_num = f.read_uint32() #bulk map num + unk_map_num
+        else:
+            self.ubulk_map_num = 0
 
-            self.unk_map_num=read_uint32(f) #number of some mipmaps in uexp
-            map_num = read_uint32(f) #map num ?
-            self.ubulk_map_num-=self.unk_map_num
-            self.uexp_map_num=map_num-self.ubulk_map_num
+        self.unk_map_num=f.read_uint32() #number of some mipmaps in uexp
+        map_num = f.read_uint32() #map num ?
+        self.ubulk_map_num-=self.unk_map_num
+        self.uexp_map_num=map_num-self.ubulk_map_num
 
-            
-            #read mipmap data
-            read_const_uint32(f, 1) #Entry Indicator?
-            read_const_uint32(f, 64) #?
-            uexp_map_size = read_uint32(f) #Length of Mipmap Data
-            read_const_uint32(f, uexp_map_size)
-            self.offset = read_uint32(f) #Offset to start of Mipmap Data
-            read_null(f)
-            #check(self.offset, self.uasset_size+f.tell())
-            uexp_map_data = f.read(uexp_map_size)
-            self.uexp_max_width=read_uint32(f)
-            self.uexp_max_height=read_uint32(f)
-            read_const_uint32(f, 1)
-            read_const_uint32(f, self.uexp_map_num)
-
-            #read mipmap meta data
+        
+        #read mipmap data
+        one, sixty_four, uexp_map_size, uexp_map_size2, self.offset, null = f.unpack(TextureUasset.MAP_DATA_LAYOUT)
+        check(one, 1, f) #Entry Indicator?
+        check(sixty_four, 64, f) #?
+        check(uexp_map_size2, uexp_map_size, f) #Length of Mipmap Data
+        #self.offset: Offset to start of Mipmap Data
+        check(null, 0, f, 'Not NULL!')
+        #check(self.offset, self.uasset_size+f.tell())
+        map_offset = f.tell()
+        if lazy:
+            #skip mipmap data and read the rest of uexp
+            with PROFILER.stage('uexp read') as stage, open(uexp_name, 'rb') as uexp:
+                uexp.seek(map_offset+uexp_map_size)
+                f = BinaryReader(uexp.read())
+                stage.size += f.size
+            self.source_files.append(os.path.abspath(uexp_name))
+        else:
+            uexp_map_data = f.read_view(uexp_map_size)
+
+        #read mipmap meta data
+        with PROFILER.stage('mipmap metadata', 16+MipmapMetadata.LAYOUT.size*map_num):
+            self.uexp_max_width, self.uexp_max_height = f.read_uint32_array(len=2)
+            f.read_const_uint32(1)
+            f.read_const_uint32(self.uexp_map_num)
             if self.has_ubulk:
-                self.ubulk_map_meta = [MipmapMetadata.read(f) for i in range(self.ubulk_map_num)]
-            self.uexp_map_meta = [MipmapMetadata.read(f) for i in range(self.uexp_map_num)]
+                self.ubulk_map_meta = MipmapMetadata.read_array(f, self.ubulk_map_num)
+            self.uexp_map_meta = MipmapMetadata.read_array(f, self.uexp_map_num)
 
-            self.none_name_id = read_uint32(f)
-            read_null(f)
-            foot=f.read()
+        self.none_name_id = f.read_uint32()
+        f.read_null()
+        foot=f.read()
 
-            check(foot, TextureUasset.UNREAL_SIGNATURE)
-            #check(f.tell()+self.uasset_size-12, end_offset)
+        check(foot, TextureUasset.UNREAL_SIGNATURE)
+        #check(f.tell()+self.uasset_size-12, end_offset)
 
         #read ubulk
-        if self.has_ubulk:
-            with open(ubulk_name, 'rb') as f:
+        if self.has_ubulk and lazy:
+            self.ubulk_map_data = []
+            offset = 0
+            for meta in self.ubulk_map_meta:
+                self.ubulk_map_data.append(FileRange(ubulk_name, offset, meta.data_size))
+                offset += meta.data_size
+            check(os.path.getsize(ubulk_name), offset)
+            self.source_files.append(os.path.abspath(ubulk_name))
+        elif self.has_ubulk and data is not None:
+            if ubulk_data is None:
+                raise RuntimeError('The asset has ubulk but ubulk data is not given.')
+            view = memoryview(ubulk_data)
+            self.ubulk_map_data = []
+            offset = 0
+            for meta in self.ubulk_map_meta:
+                self.ubulk_map_data.append(view[offset:offset+meta.data_size])
+                offset += meta.data_size
+            check(len(view), offset)
+        elif self.has_ubulk:
+            with PROFILER.stage('ubulk read') as stage, open(ubulk_name, 'rb') as f:
                 size = get_size(f)
-                self.ubulk_map_data = [f.read(meta.data_size) for meta in self.ubulk_map_meta]
-                check(size, f.tell())
+                stage.size += size
+                if use_mmap:
+                    view = self.map_file(f)
+                    self.ubulk_map_data = []
+                    offset = 0
+                    for meta in self.ubulk_map_meta:
+                        self.ubulk_map_data.append(view[offset:offset+meta.data_size])
+                        offset += meta.data_size
+                    check(size, offset)
+                else:
+                    self.ubulk_map_data = [f.read(meta.data_size) for meta in self.ubulk_map_meta]
+                    check(size, f.tell())
 
         #get format name
         if self.type not in PF_FORMAT:
-            raise RuntimeError('Unsupported format. ({})'.format(self.type))
+            raise UnsupportedError('Unsupported format. ({})'.format(self.type))
         self.format_name = PF_FORMAT[self.type]
 
         #pixel_num=0
@@ -214,13 +323,67 @@ class TextureUasset:
         i=0
         for meta in self.uexp_map_meta:
             size = int(meta.pixel_num*self.byte_per_pixel)
-            self.uexp_map_data.append(uexp_map_data[i:i+size])
+            if lazy:
+                self.uexp_map_data.append(FileRange(uexp_name, map_offset+i, size))
+            elif use_mmap or data is not None:
+                self.uexp_map_data.append(uexp_map_data[i:i+size])
+            else:
+                self.uexp_map_data.append(bytes(uexp_map_data[i:i+size]))
             i+=size
-        check(i, len(uexp_map_data))
+        check(i, uexp_map_size)
         
-        print('load: ' + uasset_name)
+        if uasset_name is not None:
+            print('load: ' + uasset_name)
         self.print(verbose)
 
+    #make an asset from bytes-like objects (name: asset name without extension)
+    def from_bytes(uasset, uexp, ubulk=None, name=None, verbose=False):
+        file_path = None if name is None else name + '.uexp'
+        return TextureUasset(file_path, verbose=verbose, data=(uasset, uexp, ubulk))
+
+    #serialize the asset and return (uasset, uexp, ubulk) as bytes (ubulk is None if the asset has no ubulk)
+    def to_bytes(self):
+        uasset_f, uexp_f, ubulk_f = io.BytesIO(), io.BytesIO(), io.BytesIO()
+        self.write(uasset_f, uexp_f, ubulk_f)
+        ubulk = ubulk_f.getvalue() if self.has_ubulk else None
+        return uasset_f.getvalue(), uexp_f.getvalue(), ubulk
+
+    #copy the asset to inject dds or remove mipmaps without changing this one
+    #(mipmap data are shared with the copy. the methods replace them but never modify them.)
+    def clone(self):
+        texture = copy.copy(self)
+        texture.uasset = self.uasset.clone()
+        texture.uexp_map_meta = [copy.copy(meta) for meta in self.uexp_map_meta]
+        texture.uexp_map_data = list(self.uexp_map_data)
+        if self.has_ubulk:
+            texture.ubulk_map_meta = [copy.copy(meta) for meta in self.ubulk_map_meta]
+            texture.ubulk_map_data = list(self.ubulk_map_data)
+        #memory-mapped files are closed by the original
+        texture.mmaps = []
+        texture.source_files = list(self.source_files)
+        return texture
+
+    #map a file to memory and return it as memoryview
+    def map_file(self, f):
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mmaps.append(mm)
+        self.source_files.append(os.path.abspath(f.name))
+        return memoryview(mm)
+
+    #release memory-mapped files
+    def close(self):
+        self.uexp_map_data = []
+        if self.has_ubulk:
+            self.ubulk_map_data = []
+        for mm in self.mmaps:
+            try:
+                mm.close()
+            except BufferError:
+                #some views are still referenced. the map will be freed with them.
+                pass
+        self.mmaps = []
+        self.source_files = []
+
     def get_max_size(self):
         if self.has_ubulk:
             meta = self.ubulk_map_meta
@@ -246,86 +409,106 @@ class TextureUasset:
         uasset_name, uexp_name, ubulk_name = get_all_file_path(file)
         if not self.has_ubulk:
             ubulk_name = None
-        
+
+        #writing to a source file would truncate the data we are reading
+        for name in [uexp_name, ubulk_name]:
+            if name is not None and os.path.abspath(name) in self.source_files:
+                raise RuntimeError('Can not overwrite a file that mipmap data refers to. ({})'.format(name))
+
+        #staged files share data with the source assets
+        for name in [uasset_name, uexp_name, ubulk_name]:
+            if name is not None:
+                unlink_staged(name)
+
+        with open(uasset_name, 'wb') as uasset_f, open(uexp_name, 'wb') as uexp_f:
+            if self.has_ubulk:
+                with open(ubulk_name, 'wb') as ubulk_f:
+                    self.write(uasset_f, uexp_f, ubulk_f)
+            else:
+                self.write(uasset_f, uexp_f)
+        print('save :' + uasset_name)
+        return uasset_name, uexp_name, ubulk_name
+
+    #write uasset, uexp and ubulk to streams (ubulk_f is required only if the asset has ubulk)
+    def write(self, uasset_f, uexp_f, ubulk_f=None):
+        if self.has_ubulk and ubulk_f is None:
+            raise RuntimeError('A stream for ubulk is required.')
+
+        #offsets are computed with tell(). write to buffers first for streams which can not seek.
+        streams = [uasset_f, uexp_f, ubulk_f]
+        if not all([is_seekable(s) for s in streams if s is not None]):
+            bufs = [None if s is None else io.BytesIO() for s in streams]
+            self.write(*bufs)
+            for s, buf in zip(streams, bufs):
+                if s is not None:
+                    s.write(buf.getbuffer())
+            return
+
         uexp_map_data_size = 0
         for d in self.uexp_map_data:
             uexp_map_data_size += len(d)
 
         uexp_map_num, ubulk_map_num = self.get_mipmap_num()
 
-        with open(uexp_name, 'wb') as f:
+        with PROFILER.stage('uexp write') as stage:
+            f = BinaryWriter(uexp_f)
+            start = f.tell()
             f.write(self.head)
 
             max_width, max_height = self.get_max_size()
 
-            write_uint32(f, max_width)
-            write_uint32(f, max_height)
-            f.write(self.id)
+            f.pack(TextureUasset.SIZE_LAYOUT, max_width, max_height, self.id)
             f.write(self.unk)
-            write_uint16_array(f, [1,1,1,0])
-            write_uint32(f, self.type_name_id)
-            write_null(f)
 
             new_end_offset = self.offset + uexp_map_data_size + uexp_map_num*32 + 16
             if self.has_ubulk:
                 new_end_offset += ubulk_map_num*32
-            write_uint32(f, new_end_offset)
-            
-            write_uint32(f, max_width)
-            write_uint32(f, max_height)
-            write_uint16(f, 1)
-            write_uint16(f, TextureUasset.UBULK_FLAG[self.has_ubulk])
-            write_str(f, self.type)
+
+            f.pack(TextureUasset.TEXTURE_LAYOUT, 1, 1, 1, 0, self.type_name_id, 0, new_end_offset,
+                   max_width, max_height, 1, TextureUasset.UBULK_FLAG[self.has_ubulk])
+            f.write_str(self.type)
 
             if self.has_ubulk:
-                write_null(f)
-                write_null(f)
-                write_uint32(f, ubulk_map_num+self.unk_map_num)
+                f.write_null_array(2)
+                f.write_uint32(ubulk_map_num+self.unk_map_num)
             
-            write_uint32(f, self.unk_map_num)
-            write_uint32(f, uexp_map_num + ubulk_map_num)
+            f.write_uint32(self.unk_map_num)
+            f.write_uint32(uexp_map_num + ubulk_map_num)
 
-            write_uint32(f, 1)
-            write_uint32(f, 64)
-            write_uint32(f, uexp_map_data_size)
-            write_uint32(f, uexp_map_data_size)
-            write_uint32(f, self.offset)
-            write_null(f)
+            f.pack(TextureUasset.MAP_DATA_LAYOUT, 1, 64, uexp_map_data_size, uexp_map_data_size, self.offset, 0)
 
             for d in self.uexp_map_data:
-                f.write(d)
+                write_data(f, d)
 
             meta = self.uexp_map_meta
             max_width=meta[0].width
             max_height=meta[0].height
-            write_uint32(f, max_width)
-            write_uint32(f, max_height)
-
-            write_uint32(f, 1)
-            write_uint32(f, uexp_map_num)
+            f.write_uint32_array([max_width, max_height, 1, uexp_map_num])
 
             #mip map meta data
             if self.has_ubulk:
                 for meta in self.ubulk_map_meta:
-                    meta.write(f, self.uasset_size)
+                    meta.write(f, self.uasset_size, start)
 
             for meta in self.uexp_map_meta:
-                meta.write(f, self.uasset_size)
+                meta.write(f, self.uasset_size, start)
 
-            write_uint32(f, self.none_name_id)
-            write_null(f)
+            f.write_uint32(self.none_name_id)
+            f.write_null()
             f.write(TextureUasset.UNREAL_SIGNATURE)
-            size = f.tell()
+            size = f.tell()-start
+            stage.size += size
 
         if self.has_ubulk:
-            with open(ubulk_name, 'wb') as f:
+            with PROFILER.stage('ubulk write') as stage:
+                start = ubulk_f.tell()
                 for data in self.ubulk_map_data:
-                    f.write(data)
+                    write_data(ubulk_f, data)
+                stage.size += ubulk_f.tell()-start
 
-        
         self.uasset.exports[0].update(size -4, self.uasset_size)
-        self.uasset.save(uasset_name, size)
-        return uasset_name, uexp_name, ubulk_name
+        self.uasset.write(uasset_f, size)
+
 
 
     def unlink_ubulk(self):
@@ -394,7 +577,7 @@ class TextureUasset:
         if dds.header.format_name=='BC6H(signed)':
             print('Warning: UE4 requires BC6H(unsigned) but your dds is BC6H(signed).')
         if new_mipmap_num>1 and (not is_power_of_2(max_width) or not is_power_of_2(max_height)):
-            print('Warning: Mipmaps should have power of 2 as its width and height. ({}, {})'.format(self.width, self.height))
+            print('Warning: Mipmaps should have power of 2 as its width and height. ({}, {})'.format(max_width, max_height))
             
 
     def print(self, verbose=False):
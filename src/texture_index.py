@@ -0,0 +1,143 @@
+import os, io, json, sqlite3, contextlib
+from texture_asset import TextureUasset, get_all_file_path
+from file_list import walk_files
+
+'''
+Texture index
+
+a sqlite database which has metadata of all texture assets in a folder.
+re-running 'index' mode only parses files which sizes or mtimes changed.
+'''
+
+STAT_COLUMNS = ['uasset_size', 'uasset_mtime', 'uexp_size', 'uexp_mtime', 'ubulk_size', 'ubulk_mtime']
+
+CREATE_TABLE = '''CREATE TABLE IF NOT EXISTS textures (
+    path TEXT PRIMARY KEY,
+    root TEXT,
+    rel_path TEXT,
+    type TEXT,
+    format_name TEXT,
+    max_width INTEGER,
+    max_height INTEGER,
+    uexp_map_num INTEGER,
+    ubulk_map_num INTEGER,
+    has_ubulk INTEGER,
+    mipmaps TEXT,
+    uasset_size INTEGER,
+    uasset_mtime INTEGER,
+    uexp_size INTEGER,
+    uexp_mtime INTEGER,
+    ubulk_size INTEGER,
+    ubulk_mtime INTEGER,
+    error TEXT
+)'''
+
+#get sizes and mtimes of uasset, uexp and ubulk
+def get_file_stats(file):
+    stats = []
+    for f in get_all_file_path(file):
+        if os.path.exists(f):
+            st = os.stat(f)
+            stats += [st.st_size, st.st_mtime_ns]
+        else:
+            stats += [None, None]
+    return stats
+
+#get metadata of a texture asset
+def get_texture_record(file):
+    with contextlib.redirect_stdout(io.StringIO()):
+        texture = TextureUasset(file, lazy=True)
+
+    mipmaps = []
+    if texture.has_ubulk:
+        for data, meta in zip(texture.ubulk_map_data, texture.ubulk_map_meta):
+            mipmaps.append({'width': meta.width, 'height': meta.height, 'file': 'ubulk', 'offset': data.offset, 'size': len(data)})
+    for data, meta in zip(texture.uexp_map_data, texture.uexp_map_meta):
+        mipmaps.append({'width': meta.width, 'height': meta.height, 'file': 'uexp', 'offset': data.offset, 'size': len(data)})
+
+    max_width, max_height = texture.get_max_size()
+    uexp_map_num, ubulk_map_num = texture.get_mipmap_num()
+    return {
+        'type': texture.type,
+        'format_name': texture.format_name,
+        'max_width': max_width,
+        'max_height': max_height,
+        'uexp_map_num': uexp_map_num,
+        'ubulk_map_num': ubulk_map_num,
+        'has_ubulk': int(texture.has_ubulk),
+        'mipmaps': json.dumps(mipmaps),
+    }
+
+class TextureIndex:
+    def __init__(self, file):
+        self.file = file
+        self.db = sqlite3.connect(file)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute(CREATE_TABLE)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    #add or update all texture assets in a folder
+    def update(self, folder):
+        root = os.path.abspath(folder)
+        print('indexing: {}'.format(root))
+        found = set()
+        parsed, skipped, failed = 0, 0, 0
+        for rel_path in walk_files(root, exts=['.uexp']):
+            path = os.path.join(root, rel_path)
+            found.add(path)
+
+            #skip unchanged files
+            stats = get_file_stats(path)
+            row = self.db.execute('SELECT {} FROM textures WHERE path=?'.format(', '.join(STAT_COLUMNS)), (path,)).fetchone()
+            if row is not None and list(row)==stats:
+                skipped += 1
+                continue
+
+            record = {'path': path, 'root': root, 'rel_path': rel_path, 'error': None}
+            record.update(zip(STAT_COLUMNS, stats))
+            try:
+                record.update(get_texture_record(path))
+                parsed += 1
+            except Exception as e:
+                #failed assets are recorded too. they will be parsed again when they are changed.
+                record['error'] = str(e)
+                print('failed: {} ({})'.format(path, e))
+                failed += 1
+
+            keys = list(record.keys())
+            self.db.execute('INSERT OR REPLACE INTO textures ({}) VALUES ({})'.format(', '.join(keys), ', '.join(['?']*len(keys))),
+                            [record[k] for k in keys])
+
+        #remove deleted files
+        removed = 0
+        for row in self.db.execute('SELECT path FROM textures WHERE root=?', (root,)).fetchall():
+            if row['path'] not in found:
+                self.db.execute('DELETE FROM textures WHERE path=?', (row['path'],))
+                removed += 1
+
+        self.db.commit()
+        print('parsed: {}, unchanged: {}, failed: {}, removed: {}'.format(parsed, skipped, failed, removed))
+
+    #get textures that match conditions
+    def query(self, format=None, min_size=None, has_ubulk=False):
+        sql = 'SELECT * FROM textures WHERE error IS NULL'
+        params = []
+        if format is not None:
+            sql += ' AND (format_name LIKE ? OR type LIKE ?)'
+            params += ['%{}%'.format(format)]*2
+        if min_size is not None:
+            sql += ' AND max(max_width, max_height)>=?'
+            params.append(min_size)
+        if has_ubulk:
+            sql += ' AND has_ubulk=1'
+        sql += ' ORDER BY path'
+        return self.db.execute(sql, params).fetchall()
+
+def print_record(row):
+    print(row['path'])
+    print('  format: {} ({})'.format(row['type'], row['format_name']))
+    print('  max size: ({}, {})'.format(row['max_width'], row['max_height']))
+    print('  mipmap num: {} (uexp: {}, ubulk: {})'.format(row['uexp_map_num']+row['ubulk_map_num'], row['uexp_map_num'], row['ubulk_map_num']))
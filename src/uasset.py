@@ -1,78 +1,38 @@
-
+import struct, copy
 from io_util import *
+from profiler import PROFILER
 
-class UassetHeader:
+class UassetHeader: #193 bytes
     HEAD = b'\xC1\x83\x2A\x9E'
+    LAYOUT = struct.Struct('<4si16sII5s4sII8sIIII4s16s16s8sI36s4s4sII12s4sI')
 
     def __init__(self, f):
-        head=f.read(4)
+        (head, version, null1, self.file_size, none_len, none, unk_ary,
+         self.name_num, self.name_offset, null2,
+         self.export_num, self.export_offset, self.import_num, self.import_offset,
+         self.unk1, null3, self.guid_hash, self.unk2, name_num, null4, self.unk3, null5,
+         self.padding_offset, self.file_length, null6, self.unk4, self.file_data_offset) = f.unpack(UassetHeader.LAYOUT)
+
         check(head, UassetHeader.HEAD, f, 'NOT a uasset file.')
-        self.version=-read_int32(f)-1
-        check(self.version, 6, f, 'Unsupported version. (version {})'.format(self.version))
-        read_null_array(f, 4, 'Parse Failed.')
-        self.file_size=read_uint32(f)
-        none=read_str(f)
-        check(none, 'None', f, 'Parse Failed.')
-        self.unk_ary=read_uint8_array(f, len=4)
-
-        self.name_num = read_uint32(f)
-        self.name_offset = read_uint32(f)
+        self.version=-version-1
+        check(self.version, 6, f, 'Unsupported version. (version {})'.format(self.version), error=UnsupportedError)
+        check((none_len, none), (5, b'None\x00'), f, 'Parse Failed.')
+        self.unk_ary=list(unk_ary)
         check(self.name_offset, 193, f, 'Parse Failed.')
-        read_null_array(f, 2, 'Parse Failed.')
-
-        self.export_num = read_uint32(f)
-        self.export_offset = read_uint32(f)
-        self.import_num = read_uint32(f)
-        self.import_offset = read_uint32(f)
-        self.unk1=f.read(4)
-        read_null_array(f, 4, 'Parse Failed.')
-
-        self.guid_hash=f.read(16)
-
-        self.unk2=f.read(8)
-
-        name_num=read_uint32(f)
         check(name_num, self.name_num, f, 'Parse Failed.')
-        read_null_array(f, 9, 'Parse Failed.')
-        self.unk3=f.read(4)
-        read_null(f, 'Parse Failed.')
-        self.padding_offset = read_uint32(f)
-        self.file_length=read_uint32(f)
-        read_null_array(f, 3, 'Parse Failed.')
-        self.unk4=f.read(4)
-        self.file_data_offset = read_uint32(f)
+        for null in [null1, null2, null3, null4, null5, null6]:
+            check(null, bytes(len(null)), f, 'Parse Failed.')
 
     def read(f):
         return UassetHeader(f)
     
     def write(f, header):
-        f.write(UassetHeader.HEAD)
-        write_int32(f, -(header.version+1))
-        write_null_array(f, 4)
-        write_uint32(f, header.file_size)
-        write_str(f, 'None')
-        write_uint8_array(f, header.unk_ary)
-        write_uint32(f, header.name_num)
-        write_uint32(f, header.name_offset)
-        write_null_array(f, 2)
-        write_uint32(f, header.export_num)
-        write_uint32(f, header.export_offset)
-        write_uint32(f, header.import_num)
-        write_uint32(f, header.import_offset)
-        f.write(header.unk1)
-        write_null_array(f, 4)
-        f.write(header.guid_hash)
-        f.write(header.unk2)
-        write_uint32(f, header.name_num)
-        write_null_array(f, 9)
-        f.write(header.unk3)
-        write_null(f)
-        write_uint32(f, header.padding_offset)
-        write_uint32(f, header.file_length)
-        write_null_array(f, 3)
-        f.write(header.unk4)
-        write_uint32(f, header.file_data_offset)
-
+        f.pack(UassetHeader.LAYOUT,
+            UassetHeader.HEAD, -(header.version+1), bytes(16), header.file_size, 5, b'None\x00', bytes(header.unk_ary),
+            header.name_num, header.name_offset, bytes(8),
+            header.export_num, header.export_offset, header.import_num, header.import_offset,
+            header.unk1, bytes(16), header.guid_hash, header.unk2, header.name_num, bytes(36), header.unk3, bytes(4),
+            header.padding_offset, header.file_length, bytes(12), header.unk4, header.file_data_offset)
 
     def print(self):
         print('Header info')
@@ -90,23 +50,24 @@ class UassetHeader:
         print('  file data offset: {}'.format(self.file_data_offset))
 
 class UassetImport: #28 bytes
-    def __init__(self, f):
-        self.bin1=f.read(8)
-        self.class_id=read_uint32(f)
-        self.bin2=f.read(8)
-        self.name_id=read_uint32(f)
-        self.bin3=f.read(4)
+    LAYOUT = struct.Struct('<8sI8sI4s')
+
+    def __init__(self, bin1, class_id, bin2, name_id, bin3):
+        self.bin1=bin1
+        self.class_id=class_id
+        self.bin2=bin2
+        self.name_id=name_id
+        self.bin3=bin3
         self.material=False
 
     def read(f):
-        return UassetImport(f)
+        return UassetImport(*f.unpack(UassetImport.LAYOUT))
+
+    def read_array(f, len):
+        return [UassetImport(*values) for values in f.unpack_array(UassetImport.LAYOUT, len)]
     
     def write(f, import_):
-        f.write(import_.bin1)
-        write_uint32(f, import_.class_id)
-        f.write(import_.bin2)
-        write_uint32(f, import_.name_id)
-        f.write(import_.bin3)
+        f.pack(UassetImport.LAYOUT, import_.bin1, import_.class_id, import_.bin2, import_.name_id, import_.bin3)
 
     def name_imports(imports, name_list):
         for import_ in imports:
@@ -122,26 +83,25 @@ class UassetExport: #104 bytes
     KNOWN_EXPORTS=['EndEmissiveColorUserData', 'SQEX_BonamikAssetUserData', 'SQEX_KineDriver_AssetUserData', 'SkelMeshBoneAttributeRedirectorUserData', 'BodySetup']
     IGNORE=[True, True, True, True, True]
     #'BodySetup'
-    def __init__(self, f):
-        self.bin1=f.read(16)
-        self.name_id=read_uint32(f)
-        self.bin2=f.read(8)
-        self.size=read_uint32(f)
-        read_null(f)
-        self.offset=read_uint32(f)
-        self.bin3=f.read(64)
+    LAYOUT = struct.Struct('<16sI8sIII64s')
+
+    def __init__(self, bin1, name_id, bin2, size, null, offset, bin3):
+        check(null, 0, msg='Not NULL!')
+        self.bin1=bin1
+        self.name_id=name_id
+        self.bin2=bin2
+        self.size=size
+        self.offset=offset
+        self.bin3=bin3
 
     def read(f):
-        return UassetExport(f)
+        return UassetExport(*f.unpack(UassetExport.LAYOUT))
+
+    def read_array(f, len):
+        return [UassetExport(*values) for values in f.unpack_array(UassetExport.LAYOUT, len)]
     
     def write(f, export):
-        f.write(export.bin1)
-        write_uint32(f, export.name_id)
-        f.write(export.bin2)
-        write_uint32(f, export.size)
-        write_null(f)
-        write_uint32(f, export.offset)
-        f.write(export.bin3)
+        f.pack(UassetExport.LAYOUT, export.bin1, export.name_id, export.bin2, export.size, 0, export.offset, export.bin3)
 
     def update(self, size, offset):
         self.size=size
@@ -154,11 +114,11 @@ class UassetExport: #104 bytes
             if name in UassetExport.KNOWN_EXPORTS:
                 export.id=UassetExport.KNOWN_EXPORTS.index(name)
                 export.ignore=UassetExport.IGNORE[export.id]
-            elif name in file_name:
+            elif file_name is None or name in file_name:
                 export.id=-1
                 export.ignore=False
             else:
-                raise RuntimeError('Unsupported assets. ({})'.format(name))
+                raise UnsupportedError('Unsupported assets. ({})'.format(name))
 
             export.name=name
 
@@ -177,17 +137,28 @@ class UassetExport: #104 bytes
 
 class Uasset:
 
-    def __init__(self, uasset_file, verbose=False):
-        if uasset_file[-7:]!='.uasset':
+    #buf: uasset data to read instead of the file (uasset_file can be None then.)
+    def __init__(self, uasset_file, verbose=False, buf=None):
+        if uasset_file is None:
+            self.file=None
+        elif uasset_file[-7:]!='.uasset':
             raise RuntimeError('Not .uasset. ({})'.format(uasset_file))
+        else:
+            self.file=os.path.basename(uasset_file)[:-7]
 
-        if verbose:
+        if verbose and uasset_file is not None:
             print('Loading '+uasset_file+'...')
 
-        self.file=os.path.basename(uasset_file)[:-7]
-        f=open(uasset_file, 'rb')
-        self.size=get_size(f)
-        self.header=UassetHeader.read(f)
+        if buf is None:
+            with PROFILER.stage('uasset read') as stage:
+                with open(uasset_file, 'rb') as f:
+                    f=BinaryReader(f.read())
+                stage.size += f.size
+        else:
+            f=BinaryReader(buf)
+        self.size=f.size
+        with PROFILER.stage('uasset header', UassetHeader.LAYOUT.size):
+            self.header=UassetHeader.read(f)
         self.bin1 = f.read(self.header.name_offset-193)
         if verbose:
             print('size: {}'.format(self.size))
@@ -196,18 +167,22 @@ class Uasset:
         
         self.name_list = []
         self.flag_list = []
-        for i in range(self.header.name_num):
-            name = read_str(f)
-            flag = f.read(4)
-            if verbose:
-                print('  {}: {}'.format(i, name))
-            self.name_list.append(name)
-            self.flag_list.append(flag)
+        with PROFILER.stage('name table') as stage:
+            offset=f.tell()
+            for i in range(self.header.name_num):
+                name = f.read_str()
+                flag = f.read(4)
+                if verbose:
+                    print('  {}: {}'.format(i, name))
+                self.name_list.append(name)
+                self.flag_list.append(flag)
+            stage.size += f.tell()-offset
         offset=f.tell()
         self.bin2=f.read(self.header.import_offset-offset)
 
-        self.imports=read_array(f, UassetImport.read, len=self.header.import_num)
-        UassetImport.name_imports(self.imports, self.name_list)
+        with PROFILER.stage('import table', UassetImport.LAYOUT.size*self.header.import_num):
+            self.imports=UassetImport.read_array(f, self.header.import_num)
+            UassetImport.name_imports(self.imports, self.name_list)
         if verbose:
             print('Import')
             for import_ in self.imports:
@@ -215,8 +190,9 @@ class Uasset:
 
         offset=f.tell()
         self.bin3=f.read(self.header.export_offset-offset)
-        self.exports=read_array(f, UassetExport.read, len=self.header.export_num)
-        UassetExport.name_exports(self.exports, self.name_list, self.file)
+        with PROFILER.stage('export table', UassetExport.LAYOUT.size*self.header.export_num):
+            self.exports=UassetExport.read_array(f, self.header.export_num)
+            UassetExport.name_exports(self.exports, self.name_list, self.file)
 
         if verbose:
             print('Export')
@@ -224,20 +200,37 @@ class Uasset:
                 export.print()
 
         self.bin4=f.read()
-        f.close()
     
+    #copy the header and exports (they are updated when writing)
+    def clone(self):
+        uasset = copy.copy(self)
+        uasset.header = copy.copy(self.header)
+        uasset.exports = [copy.copy(export) for export in self.exports]
+        return uasset
+
     def save(self, file, uexp_size):
-        self.header.file_length=uexp_size+self.size-4
         print('save :' + file)
+        unlink_staged(file)
         with open(file, 'wb') as f:
+            self.write(f, uexp_size)
+
+    #write uasset to a stream
+    def write(self, f, uexp_size):
+        self.header.file_length=uexp_size+self.size-4
+        with PROFILER.stage('uasset write') as stage:
+            f=BinaryWriter(f)
+            start=f.tell()
             UassetHeader.write(f, self.header)
             f.write(self.bin1)
             for name, flag in zip(self.name_list, self.flag_list):
-                write_str(f, name)
+                f.write_str(name)
                 f.write(flag)
 
             f.write(self.bin2)
-            write_array(f, self.imports, UassetImport.write)                
+            for import_ in self.imports:
+                UassetImport.write(f, import_)
             f.write(self.bin3)
-            write_array(f, self.exports, UassetExport.write)
-            f.write(self.bin4)
\ No newline at end of file
+            for export in self.exports:
+                UassetExport.write(f, export)
+            f.write(self.bin4)
+            stage.size += f.tell()-start
\ No newline at end of file
@@ -0,0 +1,162 @@
+import os, time, struct, select, ctypes, ctypes.util
+from file_list import walk_files
+
+'''
+File watcher for watch mode
+
+watch() calls a function for each file written in a folder (including subfolders).
+It uses inotify on Linux, or compares sizes and mtimes of files at intervals on other platforms.
+
+A file is passed to the function after its size and mtime stop changing for a while.
+(Tools can write a file in several steps. We should not read a half-written file.)
+'''
+
+#inotify flags (see sys/inotify.h)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_LAYOUT = struct.Struct('iIII') #wd, mask, cookie, name length
+
+def load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+#get (size, mtime) of a file (None if the file does not exist)
+def get_stat(file):
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def has_ext(file, exts):
+    return exts is None or os.path.splitext(file)[1].lower() in exts
+
+#watch a folder with inotify
+class InotifyWatcher:
+    def __init__(self, folder, exts, libc):
+        self.folder = folder
+        self.exts = exts
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd<0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed.')
+        self.dirs = {} #watch descriptor: relative path of a folder
+        self.add_tree('')
+
+    #watch a folder and its subfolders. returns files in them.
+    def add_tree(self, rel_dir):
+        files = []
+        for root, dirs, names in os.walk(os.path.join(self.folder, rel_dir)):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd<0:
+                raise OSError(ctypes.get_errno(), 'Failed to watch {}.'.format(root))
+            self.dirs[wd] = os.path.relpath(root, self.folder)
+            files += [os.path.relpath(os.path.join(root, n), self.folder) for n in names if has_ext(n, self.exts)]
+        return files
+
+    #wait for events and return changed files (relative paths)
+    def read(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if len(readable)==0:
+            return []
+        try:
+            buf = os.read(self.fd, 0x10000)
+        except BlockingIOError:
+            return []
+        files = []
+        offset = 0
+        while offset<len(buf):
+            wd, mask, cookie, name_len = EVENT_LAYOUT.unpack_from(buf, offset)
+            offset += EVENT_LAYOUT.size
+            name = os.fsdecode(buf[offset:offset+name_len].rstrip(b'\x00'))
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                #some events were lost. check all files.
+                files += list(walk_files(self.folder, exts=self.exts))
+                continue
+            if wd not in self.dirs or name=='':
+                continue
+            rel_path = os.path.normpath(os.path.join(self.dirs[wd], name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    #files can be written before the new folder is watched
+                    files += self.add_tree(rel_path)
+            elif has_ext(name, self.exts):
+                files.append(rel_path)
+        return files
+
+    def close(self):
+        os.close(self.fd)
+
+#watch a folder by comparing sizes and mtimes of files
+class PollingWatcher:
+    def __init__(self, folder, exts, interval):
+        self.folder = folder
+        self.exts = exts
+        self.interval = interval
+        self.stats = self.scan()
+
+    def scan(self):
+        return {file: get_stat(os.path.join(self.folder, file)) for file in walk_files(self.folder, exts=self.exts)}
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        stats = self.scan()
+        files = [file for file, stat in stats.items() if self.stats.get(file)!=stat]
+        self.stats = stats
+        return files
+
+    def close(self):
+        pass
+
+def make_watcher(folder, exts, interval, use_polling=False):
+    libc = None if use_polling else load_libc()
+    if libc is not None:
+        try:
+            return InotifyWatcher(folder, exts, libc)
+        except OSError as e:
+            print('Failed to use inotify. ({})'.format(e))
+    return PollingWatcher(folder, exts, interval)
+
+#call func(file) for each file written in a folder until Ctrl+C
+#(delay: seconds to wait after the last change of a file)
+def watch(folder, func, exts=None, delay=0.5, interval=0.5, use_polling=False):
+    if exts is not None:
+        exts = [ext.lower() for ext in exts]
+    watcher = make_watcher(folder, exts, interval, use_polling=use_polling)
+    print('watching {} with {}. (Ctrl+C to stop)'.format(folder, 'inotify' if isinstance(watcher, InotifyWatcher) else 'polling'))
+    pending = {} #relative path: [stat, time of the last change]
+    try:
+        while True:
+            for file in watcher.read(delay if len(pending)>0 else 1.0):
+                pending[file] = [get_stat(os.path.join(folder, file)), time.monotonic()]
+
+            now = time.monotonic()
+            for file in sorted(pending):
+                stat, changed = pending[file]
+                new_stat = get_stat(os.path.join(folder, file))
+                if new_stat is None:
+                    #removed or renamed
+                    del pending[file]
+                elif new_stat!=stat:
+                    #still being written
+                    pending[file] = [new_stat, now]
+                elif now-changed>=delay:
+                    del pending[file]
+                    func(file)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()